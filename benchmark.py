@@ -0,0 +1,286 @@
+import argparse
+import bisect
+import itertools
+import json
+import random
+import resource
+import sys
+import time
+from commandparser import parseLine
+from operations import OperationStatus
+from transactions import TransactionStatus, SnapshotTransaction, ISOLATION_LEVELS
+from transactionManager import TransactionManager, VICTIM_POLICIES
+from output import TextSink, QUIET
+from waitforgraph import PREVENTION_POLICIES
+
+# python3 benchmark.py --transactions 2000 --zipf 1.1 --emit workload.txt
+# generates a workload in the input language, drives a TransactionManager with it
+# in-process and prints the results as one JSON object.
+
+class KeyChooser:
+    """
+    picks record ids, uniformly if skew is 0 and from a Zipfian distribution
+    with exponent skew otherwise, record 1 being the most popular one.
+    """
+
+    def __init__(self, numOfRecords, skew, rng):
+        self.numOfRecords = numOfRecords
+        self.rng = rng
+        self.cumulativeWeights = None
+        if skew > 0:
+            self.cumulativeWeights = list(itertools.accumulate(1.0 / rank ** skew for rank in range(1, numOfRecords + 1)))
+
+    def choose(self):
+        if self.cumulativeWeights is None:
+            return self.rng.randint(1, self.numOfRecords)
+        position = self.rng.random() * self.cumulativeWeights[-1]
+        return 1 + bisect.bisect_left(self.cumulativeWeights, position)
+
+class WorkloadDriver:
+    """
+    Generates the workload one line at a time, based on the state of the
+    TransactionManager it drives, so that every line is valid input:
+    an operation is only sent to a transaction that is not waiting, a transaction
+    is only ended once all its operations are done, only live sites fail and
+    only failed sites recover.
+    Every line that was executed is kept in lines, replaying them gives the same run.
+    """
+
+    def __init__(self, transManager, arguments):
+        """
+        live maps the id of every live transaction to the number of records it has
+        been sent reads and writes of so far, keys counts them over all transactions.
+        pending are the operations that have not completed yet, with the tick they were sent at.
+        """
+        self.transManager = transManager
+        self.arguments = arguments
+        self.rng = random.Random(arguments.seed)
+        self.keys = KeyChooser(transManager.numOfRecords, arguments.zipf, self.rng)
+        self.live = {}
+        self.readOnly = set()
+        self.pending = []
+        self.failedSites = set()
+        self.begun = 0
+        self.lines = []
+        self.latencies = []
+        self.committed = 0
+        self.aborted = 0
+        self.deadlocked = 0
+        self.preventionAborts = 0
+        self.writeConflicts = 0
+        self.stalled = 0
+        self.keysSent = 0
+
+    def execute(self, line):
+        operation = parseLine(line, len(self.lines) + 1, self.transManager.numOfRecords, self.transManager.numOfSites)
+        self.lines.append(line)
+        self.transManager.execute(operation)
+        if getattr(operation, "status", None) == OperationStatus.IN_PROGRESS:
+            self.pending.append((self.transManager.time, operation))
+        self.collectCompleted()
+
+    def collectCompleted(self):
+        """
+        records the latency in ticks of the operations that have completed.
+        """
+        stillPending = []
+        for sentAt, operation in self.pending:
+            if operation.status == OperationStatus.COMPLETED:
+                self.latencies.append(self.transManager.time - sentAt)
+            else:
+                stillPending.append((sentAt, operation))
+        self.pending = stillPending
+
+    def isWaiting(self, transactionId):
+        return any(operation.transactionId == transactionId for _, operation in self.pending)
+
+    def end(self, transactionId):
+        transaction = self.transManager.liveTransactions[transactionId]
+        siteFailure = transaction.status == TransactionStatus.ABORTED
+        self.execute("end({})".format(transactionId))
+        if transaction.isDeadlocked and transaction.abortReason == "deadlockPrevention":
+            self.preventionAborts += 1
+            self.aborted += 1
+        elif transaction.isDeadlocked:
+            self.deadlocked += 1
+            self.aborted += 1
+        elif isinstance(transaction, SnapshotTransaction) and transaction.writeConflict:
+            self.writeConflicts += 1
+            self.aborted += 1
+        elif siteFailure:
+            self.aborted += 1
+        else:
+            self.committed += 1
+        del self.live[transactionId]
+
+    def nextLine(self):
+        """
+        executes the next line of the workload.
+        """
+        arguments = self.arguments
+        if self.rng.random() < arguments.failure_rate:
+            site = self.rng.randint(1, self.transManager.numOfSites)
+            if site in self.failedSites:
+                self.failedSites.discard(site)
+                self.execute("recover({})".format(site))
+            else:
+                self.failedSites.add(site)
+                self.execute("fail({})".format(site))
+            return
+
+        if self.begun < arguments.transactions and len(self.live) < arguments.concurrency:
+            self.begun += 1
+            transactionId = "T{}".format(self.begun)
+            if self.rng.random() < arguments.read_only:
+                self.readOnly.add(transactionId)
+                self.execute("beginRO({})".format(transactionId))
+            else:
+                self.execute("begin({})".format(transactionId))
+            self.live[transactionId] = 0
+            return
+
+        ready = [transactionId for transactionId in self.live if not self.isWaiting(transactionId)]
+        if not ready:
+            self.unblock()
+            return
+        transactionId = self.rng.choice(ready)
+        if self.live[transactionId] >= arguments.length:
+            self.end(transactionId)
+        elif arguments.batch > 1:
+            self.sendBatch(transactionId)
+        elif transactionId in self.readOnly or self.rng.random() < arguments.read_fraction:
+            self.live[transactionId] += 1
+            self.keysSent += 1
+            self.execute("R({},x{})".format(transactionId, self.keys.choose()))
+        else:
+            self.live[transactionId] += 1
+            self.keysSent += 1
+            self.execute("W({},x{},{})".format(transactionId, self.keys.choose(), len(self.lines)))
+
+    def sendBatch(self, transactionId):
+        """
+        sends the next reads or writes of a transaction as one MR or MW
+        of up to batch distinct records.
+        """
+        arguments = self.arguments
+        size = min(arguments.batch, arguments.length - self.live[transactionId], self.transManager.numOfRecords)
+        records = set()
+        while len(records) < size:
+            records.add(self.keys.choose())
+        self.live[transactionId] += size
+        self.keysSent += size
+        if transactionId in self.readOnly or self.rng.random() < arguments.read_fraction:
+            self.execute("MR({},{})".format(transactionId, ",".join("x{}".format(record) for record in sorted(records))))
+        else:
+            self.execute("MW({},{})".format(transactionId, ",".join("x{}={}".format(record, len(self.lines)) for record in sorted(records))))
+
+    def unblock(self):
+        """
+        every live transaction is waiting, recovers a failed site or runs one more
+        tick to let the deadlock detection run. If that does not help the live
+        transactions can never finish, e.g. they read a replicated record whose
+        every copy has failed since it was written, so they are given up on.
+        """
+        if self.failedSites:
+            self.execute("recover({})".format(self.failedSites.pop()))
+            return
+        before = len(self.pending)
+        self.execute("dump()")
+        if len(self.pending) < before:
+            return
+        self.stalled += len(self.live)
+        self.live = {}
+        self.pending = []
+
+    def run(self):
+        while self.live or self.begun < self.arguments.transactions:
+            self.nextLine()
+
+def peakMemory():
+    """
+    the peak resident set size of this process in bytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def runBenchmark(arguments, measureMemory=True):
+    """
+    runs the workload the arguments describe and returns its results.
+    The peak memory is of the whole process, it is left out with measureMemory
+    False as it would carry over the peaks of earlier runs in the same process.
+    """
+    transManager = TransactionManager(arguments.sites, arguments.records, None, arguments.victim_policy, output=TextSink(level=QUIET), \
+        deadlockPrevention=arguments.deadlock_prevention, isolation=arguments.isolation, deferredWrites=arguments.deferred_writes)
+    driver = WorkloadDriver(transManager, arguments)
+    start = time.perf_counter()
+    driver.run()
+    elapsed = time.perf_counter() - start
+
+    if arguments.emit:
+        with open(arguments.emit, "w") as workloadFile:
+            workloadFile.write("\n".join(driver.lines) + "\n")
+
+    latencies = sorted(driver.latencies)
+    def percentile(fraction):
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] if latencies else 0
+    ended = driver.committed + driver.aborted
+    results = {
+        "config": dict(vars(arguments)),
+        "operations": len(driver.lines),
+        "seconds": elapsed,
+        "opsPerSecond": len(driver.lines) / elapsed if elapsed else 0,
+        "keysPerSecond": driver.keysSent / elapsed if elapsed else 0,
+        "latencyTicks": {
+            "mean": sum(latencies) / len(latencies) if latencies else 0,
+            "p50": percentile(0.5),
+            "p99": percentile(0.99),
+            "max": latencies[-1] if latencies else 0,
+        },
+        "committed": driver.committed,
+        "aborted": driver.aborted,
+        "abortRate": driver.aborted / ended if ended else 0,
+        "deadlocks": driver.deadlocked,
+        "preventionAborts": driver.preventionAborts,
+        "writeConflicts": driver.writeConflicts,
+        "stalled": driver.stalled,
+    }
+    if measureMemory:
+        results["peakMemoryBytes"] = peakMemory()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput and latency benchmark for RepCRec.")
+    parser.add_argument("--transactions", type=int, default=1000, help="Number of transactions.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of transactions that are live at the same time.")
+    parser.add_argument("--length", type=int, default=4, help="Reads and writes per transaction.")
+    parser.add_argument("--read-fraction", type=float, default=0.5, help="Fraction of the operations of read write transactions that are reads.")
+    parser.add_argument("--read-only", type=float, default=0.2, help="Fraction of the transactions that are read only.")
+    parser.add_argument("--zipf", type=float, default=0.0, help="Zipfian skew of the record ids, 0 is uniform.")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Probability that a line fails or recovers a site.")
+    parser.add_argument("--sites", type=int, default=10, help="Number of sites.")
+    parser.add_argument("--records", type=int, default=20, help="Number of records.")
+    parser.add_argument("--victim-policy", default="youngest", choices=sorted(VICTIM_POLICIES))
+    parser.add_argument("--deadlock-prevention", default=None, choices=sorted(PREVENTION_POLICIES), help="Prevent deadlocks instead of detecting them.")
+    parser.add_argument("--compare-deadlock-handling", action="store_true", \
+        help="Run the same workload with deadlock detection and with every prevention scheme.")
+    parser.add_argument("--isolation", default="2pl", choices=sorted(ISOLATION_LEVELS), help="Isolation of the read write transactions.")
+    parser.add_argument("--compare-isolation", action="store_true", help="Run the same workload under every isolation level.")
+    parser.add_argument("--deferred-writes", action="store_true", help="Buffer the writes of a transaction until it commits.")
+    parser.add_argument("--batch", type=int, default=1, help="Send up to this many reads or writes of a transaction as one MR or MW.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--emit", default=None, help="Write the generated workload to this file.")
+    arguments = parser.parse_args()
+    if arguments.compare_deadlock_handling:
+        results = {}
+        for prevention in [None] + sorted(PREVENTION_POLICIES):
+            arguments.deadlock_prevention = prevention
+            results[prevention or "detection"] = runBenchmark(arguments, measureMemory=False)
+        print(json.dumps(results, indent=2))
+    elif arguments.compare_isolation:
+        results = {}
+        for isolation in sorted(ISOLATION_LEVELS):
+            arguments.isolation = isolation
+            results[isolation] = runBenchmark(arguments, measureMemory=False)
+        print(json.dumps(results, indent=2))
+    else:
+        print(json.dumps(runBenchmark(arguments), indent=2))
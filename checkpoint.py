@@ -0,0 +1,111 @@
+import mmap
+import os
+import struct
+from array import array
+from ast import literal_eval
+from collections import deque
+
+# magic, time, number of records, number of failed times, if the site is failed
+HEADER = struct.Struct("<4sqqqq")
+MAGIC = b"RCC3"
+
+def writeCheckpoint(path, dm, time):
+    """
+    writes the latest committed version of every record of a site, whether each
+    record is recovered, the status and failedTimes of the site and the time of the
+    checkpoint into a binary file.
+    The file is laid out as the header, the failedTimes, the record ids, the commit
+    times, the recovered flags, the offsets of the entries into the blob and the blob of
+    "transactionId\\0data" entries, both written as their repr so they come back with
+    their types and a \\0 in them is escaped. It is written to a temporary file which then
+    replaces the old checkpoint, so a crash never leaves a torn checkpoint behind.
+    """
+    recordIds = array("q")
+    commitTimes = array("q")
+    recovered = array("q")
+    offsets = array("q", [0])
+    blob = bytearray()
+    for recordId, record in dm.records.items():
+        version = record.committedVersions[-1]
+        recordIds.append(recordId)
+        commitTimes.append(version.commitTime)
+        recovered.append(record.recovered)
+        blob += "{!r}\0{!r}".format(version.transactionId, version.data).encode()
+        offsets.append(len(blob))
+    failedTimes = array("q", dm.failedTimes)
+
+    temporaryPath = path + ".tmp"
+    with open(temporaryPath, "wb") as checkpointFile:
+        checkpointFile.write(HEADER.pack(MAGIC, time, len(recordIds), len(failedTimes), dm.isFailed()))
+        for column in (failedTimes, recordIds, commitTimes, recovered, offsets):
+            column.tofile(checkpointFile)
+        checkpointFile.write(blob)
+        checkpointFile.flush()
+        os.fsync(checkpointFile.fileno())
+    os.replace(temporaryPath, path)
+
+def readCheckpoint(path):
+    """
+    maps a checkpoint file into memory and returns (time, failedTimes, failed, versions),
+    versions yields (record, data, transactionId, commitTime, recovered) for every record.
+    Returns None if there is no checkpoint.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as checkpointFile:
+        view = mmap.mmap(checkpointFile.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, time, numOfRecords, numOfFailedTimes, failed = HEADER.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise Exception("InputError: {} is not a checkpoint file".format(path))
+
+    position = HEADER.size
+    columns = []
+    for length in (numOfFailedTimes, numOfRecords, numOfRecords, numOfRecords, numOfRecords + 1):
+        column = array("q")
+        column.frombytes(view[position:position + length * column.itemsize])
+        position += length * column.itemsize
+        columns.append(column)
+    failedTimes, recordIds, commitTimes, recovered, offsets = columns
+
+    def versions():
+        for i in range(numOfRecords):
+            entry = view[position + offsets[i]:position + offsets[i + 1]].decode()
+            transactionId, data = entry.split("\0", 1)
+            yield recordIds[i], literal_eval(data), literal_eval(transactionId), commitTimes[i], bool(recovered[i])
+        view.close()
+
+    return time, list(failedTimes), bool(failed), versions()
+
+class Checkpointer:
+    """
+    Takes a checkpoint of every site once every interval ticks.
+    A round of checkpoints is spread over the ticks, one site per tick, so taking it
+    never holds up the processing of the input for more than one tick.
+    After a site is checkpointed its write-ahead log is truncated, so a restart
+    loads the checkpoint and only replays the versions committed after it.
+    """
+
+    def __init__(self, dataManagers, directory, interval):
+        """
+        pending are the ids of the sites that still have to be checkpointed in this round.
+        checkpoints counts the checkpoint files written so far.
+        """
+        self.dataManagers = dataManagers
+        self.directory = directory
+        self.interval = interval
+        self.pending = deque([])
+        self.checkpoints = 0
+
+    def tick(self, time):
+        """
+        starts a new round every interval ticks and checkpoints the next site of the round.
+        """
+        if not self.pending and time % self.interval == 0:
+            self.pending = deque(self.dataManagers.keys())
+        if self.pending:
+            dm = self.dataManagers[self.pending.popleft()]
+            dm.checkpoint(checkpointPath(self.directory, dm.dataManagerId), time)
+            self.checkpoints += 1
+
+def checkpointPath(directory, dataManagerId):
+    return os.path.join(directory, "site{}.ckpt".format(dataManagerId))
@@ -0,0 +1,195 @@
+import queue
+import re
+import threading
+from operations import *
+
+# One precompiled pattern for every command, the name and the arguments are captured.
+# Only MW takes assignments, so it is the only command whose arguments may contain =.
+COMMAND_PATTERN = re.compile(r"^(beginRO|begin|MR|R|W|dump|end|fail|recover)[(]([A-Za-z0-9, ]*)[)]$")
+MULTI_WRITE_PATTERN = re.compile(r"^(MW)[(]([A-Za-z0-9=, ]*)[)]$")
+RECORD_PATTERN = re.compile(r"^x[1-9][0-9]*$")
+SITE_PATTERN = re.compile(r"^[1-9][0-9]*$")
+ASSIGNMENT_PATTERN = re.compile(r"^(x[1-9][0-9]*)=([A-Za-z0-9]+)$")
+
+# Marks a quit line in the stream of parsed operations.
+QUIT = object()
+
+class ParseError(Exception):
+    """
+    raised when a line doesnt match the input requirements.
+    """
+
+    def __init__(self, line, lineNumber=None):
+        super().__init__(line)
+        self.line = line
+        self.lineNumber = lineNumber
+
+    def __str__(self):
+        return "InputError: The given input - {} on line {} doesnt match the input requirements.".format(self.line, self.lineNumber)
+
+def parseArgs(inp, assignments=False):
+    """
+    splits the arguments between the parenthesis, empty arguments are dropped.
+    With assignments every argument is kept, as MW takes assignments like x2=5
+    and checks them itself.
+    """
+    args = []
+    for elem in inp.split(","):
+        elem = elem.strip()
+        if elem and (assignments or elem.isalnum()):
+            args.append(elem)
+    return args
+
+def isRecord(arg, numOfRecords):
+    """
+    check to see if arg names one of the records, like x12.
+    """
+    return RECORD_PATTERN.match(arg) is not None and int(arg[1:]) <= numOfRecords
+
+def isSite(arg, numOfSites):
+    """
+    check to see if arg is the id of one of the sites.
+    """
+    return SITE_PATTERN.match(arg) is not None and int(arg) <= numOfSites
+
+def buildBegin(args, numOfRecords, numOfSites):
+    if len(args) == 1:
+        return BeginOp(args[0])
+
+def buildBeginRO(args, numOfRecords, numOfSites):
+    if len(args) == 1:
+        return BeginROOp(args[0])
+
+def buildRead(args, numOfRecords, numOfSites):
+    if len(args) == 2 and isRecord(args[1], numOfRecords):
+        return ReadOp(args[0], args[1])
+
+def buildWrite(args, numOfRecords, numOfSites):
+    if len(args) == 3 and isRecord(args[1], numOfRecords):
+        return WriteOp(args[0], args[1], args[2])
+
+def buildMultiRead(args, numOfRecords, numOfSites):
+    records = args[1:]
+    if len(records) > 0 and len(set(records)) == len(records) and all(isRecord(record, numOfRecords) for record in records):
+        return MultiReadOp(args[0], records)
+
+def buildMultiWrite(args, numOfRecords, numOfSites):
+    assignments = [ASSIGNMENT_PATTERN.match(arg) for arg in args[1:]]
+    if len(assignments) == 0 or not args[0].isalnum() or not all(assignments):
+        return None
+    writes = [assignment.groups() for assignment in assignments]
+    records = [record for record, value in writes]
+    if len(set(records)) == len(records) and all(isRecord(record, numOfRecords) for record in records):
+        return MultiWriteOp(args[0], writes)
+
+def buildDump(args, numOfRecords, numOfSites):
+    if len(args) == 0:
+        return DumpOp()
+
+def buildEnd(args, numOfRecords, numOfSites):
+    if len(args) == 1:
+        return EndOp(args[0])
+
+def buildFail(args, numOfRecords, numOfSites):
+    if len(args) == 1 and isSite(args[0], numOfSites):
+        return FailOp(args[0])
+
+def buildRecover(args, numOfRecords, numOfSites):
+    if len(args) == 1 and isSite(args[0], numOfSites):
+        return RecoverOp(args[0])
+
+# Maps a command name to the function that builds its operation, or returns None if the arguments are wrong.
+COMMANDS = {
+    "begin": buildBegin,
+    "beginRO": buildBeginRO,
+    "R": buildRead,
+    "W": buildWrite,
+    "MR": buildMultiRead,
+    "MW": buildMultiWrite,
+    "dump": buildDump,
+    "end": buildEnd,
+    "fail": buildFail,
+    "recover": buildRecover,
+}
+
+def parseLine(line, lineNumber=None, numOfRecords=20, numOfSites=10):
+    """
+    parses a single line in one pass, returns None for empty lines and comments
+    and throws a ParseError if there is a problem.
+    Record and site ids are checked against numOfRecords and numOfSites.
+    """
+    line = line.split("//", 1)[0].strip()
+    if not line:
+        return None
+
+    match = COMMAND_PATTERN.match(line) or MULTI_WRITE_PATTERN.match(line)
+    operation = COMMANDS[match.group(1)](parseArgs(match.group(2), match.group(1) == "MW"), numOfRecords, numOfSites) if match else None
+    if operation is None:
+        raise ParseError(line, lineNumber)
+    return operation
+
+
+class OperationReader:
+    """
+    Reads and parses the input on a producer thread and hands the parsed
+    operations over in batches through a bounded queue, so that parsing
+    overlaps with processing and the queue is not touched once per line.
+    A batch is handed over early whenever the queue runs empty, so interactive
+    input is not held back waiting for a full batch.
+    Iterating over it yields (lineNumber, line, operation) for every line that
+    is not empty or a comment, where operation is QUIT for a quit line and a
+    ParseError for a line that doesnt match the input requirements.
+    """
+
+    def __init__(self, inputFile, numOfRecords=20, numOfSites=10, stats=None, batchSize=512, maxBatches=64):
+        """
+        stats, if given, times the parsing, apart from the phases of the ticks
+        as it runs on the producer thread alongside them.
+        """
+        self.inputFile = inputFile
+        self.stats = stats
+        self.numOfRecords = numOfRecords
+        self.numOfSites = numOfSites
+        self.batchSize = batchSize
+        self.batches = queue.Queue(maxBatches)
+        self.producer = threading.Thread(target=self.produce, daemon=True)
+        self.producer.start()
+
+    def produce(self):
+        """
+        parses the input and puts batches on the queue, None marks the end of the input.
+        A quit line or a parse error ends the input as nothing after it is processed.
+        """
+        batch = []
+        try:
+            for lineNumber, line in enumerate(self.inputFile, 1):
+                if line.strip().lower() == "quit":
+                    batch.append((lineNumber, line, QUIT))
+                    break
+                try:
+                    if self.stats is None:
+                        operation = parseLine(line, lineNumber, self.numOfRecords, self.numOfSites)
+                    else:
+                        with self.stats.parsing():
+                            operation = parseLine(line, lineNumber, self.numOfRecords, self.numOfSites)
+                except ParseError as error:
+                    batch.append((lineNumber, line, error))
+                    break
+                if operation is None:
+                    continue
+                batch.append((lineNumber, line, operation))
+                if len(batch) >= self.batchSize or self.batches.empty():
+                    self.batches.put(batch)
+                    batch = []
+        finally:
+            if batch:
+                self.batches.put(batch)
+            self.batches.put(None)
+
+    def __iter__(self):
+        while True:
+            batch = self.batches.get()
+            if batch is None:
+                return
+            for entry in batch:
+                yield entry
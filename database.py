@@ -0,0 +1,206 @@
+from concurrent.futures import Future
+from errors import RecordOutOfRangeError, SiteStateError, TransactionAborted, UnknownTransactionError
+from operations import *
+from output import TextSink, QUIET
+from transactionManager import TransactionManager
+from transactions import ReadOnlyTransaction, TransactionStatus
+
+class Database:
+    """
+    Embeds RepCRec in a program. The operations are built directly instead of
+    being parsed from text, and no events are written unless an output is given.
+    Every call that executes an operation runs one tick of the TransactionManager.
+    Reads and writes return a Future, it is done right away unless the operation
+    has to wait, then a later tick completes it, or it fails with TransactionAborted
+    if its transaction gets aborted first.
+    An operation that can not be executed raises an InputError and nothing is executed.
+    Records are given by their id, like 2, or their name, like "x2".
+    """
+
+    def __init__(self, numOfSites=10, numOfRecords=20, output=None, **options):
+        """
+        options are handed to the TransactionManager, like isolation or deferredWrites.
+        pending maps the operations that have not completed yet to
+        (their future, their transaction, a function that turns their result into the future's).
+        """
+        self.transManager = TransactionManager(numOfSites, numOfRecords, None, \
+            output=output if output is not None else TextSink(level=QUIET), **options)
+        self.pending = {}
+        self.transactionsBegun = 0
+
+    @property
+    def time(self):
+        return self.transManager.time
+
+    def begin(self, transactionId=None, readOnly=False):
+        """
+        begins a read write or read only transaction and returns its TransactionHandle,
+        transactionId is picked if it is not given.
+        """
+        if transactionId is None:
+            transactionId = self.newTransactionId()
+        self.execute(BeginROOp(transactionId) if readOnly else BeginOp(transactionId))
+        return TransactionHandle(self, self.transManager.liveTransactions[transactionId])
+
+    def newTransactionId(self):
+        """
+        the next of T1, T2, ... that has not been used yet.
+        """
+        while True:
+            self.transactionsBegun += 1
+            transactionId = "T{}".format(self.transactionsBegun)
+            if not self.transManager.isKnownTransaction(transactionId):
+                return transactionId
+
+    def fail(self, site):
+        if self.transManager.placement.isValidSite(site) and site in self.transManager.placement.failedSites:
+            raise SiteStateError(site, "failed")
+        self.execute(FailOp(site))
+
+    def recover(self, site):
+        if self.transManager.placement.isValidSite(site) and site not in self.transManager.placement.failedSites:
+            raise SiteStateError(site, "live")
+        self.execute(RecoverOp(site))
+
+    def dump(self):
+        """
+        returns the committed values of every site as a dict of site id to a dict
+        of record id to value, a killed site maps to None.
+        """
+        operation = DumpOp()
+        self.execute(operation)
+        return {siteId: None if values is None else dict(values) for siteId, values in operation.result.items()}
+
+    def getStats(self):
+        return self.transManager.getStats()
+
+    def record(self, record):
+        """
+        the id of record, which has to be one of the records.
+        """
+        if isinstance(record, str) and record[:1] == "x" and record[1:].isdigit():
+            record = int(record[1:])
+        if not isinstance(record, int) or isinstance(record, bool) or not 1 <= record <= self.transManager.numOfRecords:
+            raise RecordOutOfRangeError(record, self.transManager.numOfRecords)
+        return record
+
+    def execute(self, operation):
+        """
+        executes operation as one tick and settles the futures of the operations
+        that have completed since.
+        """
+        self.transManager.check(operation)
+        self.transManager.execute(operation, checked=True)
+        self.settle()
+
+    def submit(self, operation, transaction, toResult):
+        """
+        executes an operation of transaction and returns its future.
+        """
+        future = Future()
+        self.pending[operation] = (future, transaction, toResult)
+        try:
+            self.execute(operation)
+        except BaseException:
+            del self.pending[operation]
+            raise
+        return future
+
+    def settle(self):
+        """
+        completes the futures of the operations that have completed, an operation
+        that completed without a result was cut short by its transaction aborting.
+        """
+        settled = []
+        for operation, (future, transaction, toResult) in self.pending.items():
+            if operation.status == OperationStatus.COMPLETED and operation.result is not None:
+                future.set_result(toResult(operation.result))
+            elif operation.status == OperationStatus.COMPLETED or transaction.status == TransactionStatus.COMPLETED:
+                future.set_exception(TransactionAborted(transaction.transactionId, transaction.abortReason))
+            else:
+                continue
+            settled.append(operation)
+        for operation in settled:
+            del self.pending[operation]
+
+    def abort(self, transaction, reason):
+        """
+        aborts a live transaction outside of a tick, the operations it has woken up
+        are retried right away.
+        """
+        self.transManager.abortTransaction(transaction.transactionId, reason)
+        self.transManager.refreshOperations()
+        self.settle()
+
+
+class TransactionHandle:
+    """
+    A transaction begun on a Database, reads and writes return Futures.
+    """
+
+    def __init__(self, database, transaction):
+        self.database = database
+        self.transaction = transaction
+        self.transactionId = transaction.transactionId
+
+    def read(self, record):
+        """
+        the future of the value of record.
+        """
+        operation = ReadOp(self.transactionId, self.database.record(record))
+        return self.database.submit(operation, self.transaction, lambda result: result[1])
+
+    def readMany(self, records):
+        """
+        the future of a dict of record id to value, the records are read together like MR.
+        """
+        operation = MultiReadOp(self.transactionId, {self.database.record(record) for record in records})
+        return self.database.submit(operation, self.transaction, \
+            lambda result: {record: value for record, (siteId, value) in result.items()})
+
+    def write(self, record, value):
+        """
+        the future of the list of sites value is written to.
+        """
+        operation = WriteOp(self.transactionId, self.database.record(record), value)
+        return self.database.submit(operation, self.transaction, lambda result: result)
+
+    def writeMany(self, values):
+        """
+        writes a dict of record to value together like MW, the future is of a dict
+        of record id to the list of sites it is written to.
+        """
+        writes = [(self.database.record(record), value) for record, value in values.items()]
+        operation = MultiWriteOp(self.transactionId, writes)
+        return self.database.submit(operation, self.transaction, lambda result: result)
+
+    def commit(self):
+        """
+        ends the transaction, raises TransactionAborted if it could not commit.
+        """
+        self.database.execute(EndOp(self.transactionId))
+        if self.transaction.abortReason is not None:
+            raise TransactionAborted(self.transactionId, self.transaction.abortReason)
+
+    def abort(self, reason="requested"):
+        """
+        aborts the transaction right away, it can not be used afterwards.
+        """
+        if self.transaction.status == TransactionStatus.COMPLETED:
+            raise UnknownTransactionError(self.transactionId)
+        self.database.abort(self.transaction, reason)
+
+    @property
+    def readOnly(self):
+        return isinstance(self.transaction, ReadOnlyTransaction)
+
+    @property
+    def waiting(self):
+        """
+        if any operation of the transaction is still waiting.
+        """
+        return any(operation.status == OperationStatus.IN_PROGRESS for operation in self.transaction.operations)
+
+    @property
+    def abortReason(self):
+        return self.transaction.abortReason
@@ -1,6 +1,8 @@
 from record import *
+from bisect import bisect_right
 from enum import Enum
 from collections import OrderedDict
+from checkpoint import readCheckpoint, writeCheckpoint
 
 class DataManagerStatus(Enum):
     LIVE = 1
@@ -11,23 +13,35 @@ class DataManager:
     This class represent a single site.
     """
 
-    def __init__(self, dataManagerId, numOfRecords):
+    def __init__(self, dataManagerId, placement, waitForGraph=None, waitQueue=None, log=None):
         """
-        failedTimes are list of times at which this site had failed.
+        placement is the PlacementDirectory shared by all sites, it decides
+        which records reside on this site.
+        failedTimes are list of times at which this site had failed, in increasing order.
         We will use it in multiversion read to determine if we can read a
         replicated record from this site.
         records are all the records that reside on this site,
         it is a collection of objects of Record class.
+        waitForGraph is the wait-for graph shared by all sites, the records
+        keep it up to date as locks are queued and released.
+        waitQueue is where the records hand over blocked operations when they change.
+        gcCandidates are the ids of the records that have been written since the
+        version garbage collector last looked at them.
+        transactionRecords maps a transaction id to the ids of the records it has
+        lock requests or uncommitted versions on, so that committing or aborting
+        it only touches those records.
+        log is the WriteAheadLog of this site, or None if committed versions are
+        only kept in memory.
         """
         self.dataManagerId = dataManagerId
         self.status = DataManagerStatus.LIVE
         self.failedTimes = []
         self.records = OrderedDict()
-        for i in range(1, numOfRecords + 1):
-            if i % 2 == 0:
-                self.records[i] = Record(initialValue=i*10, replicated=True)
-            elif self.dataManagerId == 1 + ( i % 10 ):
-                self.records[i] = Record(initialValue=i*10, replicated=False)
+        self.gcCandidates = OrderedDict()
+        self.transactionRecords = {}
+        self.log = log
+        for i in placement.recordsAt(self.dataManagerId):
+            self.records[i] = Record(initialValue=i*10, replicated=placement.isReplicated(i), waitForGraph=waitForGraph, waitQueue=waitQueue)
 
     
     def isReadOKForRWTrans(self, record, transactionId):
@@ -47,26 +61,33 @@ class DataManager:
         check to see if a read only transaction can read a record from this site,
         and if yes it returns the data too.
         """
+        return self.readRecordAsOf(record, transStartTime)
+
+    def readRecordAsOf(self, record, asOfTime):
+        """
+        reads the newest version of a record committed at or before asOfTime.
+        A replicated record can not be read if this site failed between
+        that commit and asOfTime.
+        Both lookups are binary searches.
+        """
         if self.status == DataManagerStatus.FAILED or record not in self.records:
             return [False, None]
         
-        versionToRead = None
-        for version in self.records[record].versions:
-            if version.commitTime != None and version.commitTime <= transStartTime:
-                versionToRead = version
-                break
+        versionToRead = self.records[record].getVersionAsOf(asOfTime)
         if versionToRead == None:
-            versionToRead = self.records[record].versions[-1]
+            return [False, None]
         
-        if self.records[record].replicated:
-            for failTimes in self.failedTimes:
-                if versionToRead.commitTime < failTimes < transStartTime:
-                    return [False, None]
+        if self.records[record].replicated and self.failedBetween(versionToRead.commitTime, asOfTime):
+            return [False, None]
         
         return [True,versionToRead.data]
-        
-
 
+    def failedBetween(self, startTime, endTime):
+        """
+        check to see if this site failed strictly between startTime and endTime.
+        """
+        position = bisect_right(self.failedTimes, startTime)
+        return position < len(self.failedTimes) and self.failedTimes[position] < endTime
 
     def isWriteOKForRWTrans(self, record):
         """
@@ -80,25 +101,45 @@ class DataManager:
         else:
             return False
 
-    def requestReadLock(self, transactionId, record):
+    def requestReadLock(self, transactionId, record, startTime=None):
         """
-        transaction requests a read lock on record.
+        transaction requests a read lock on record, startTime is its start time.
         """
         if self.status == DataManagerStatus.FAILED:
             return
 
         if record in self.records:
-            self.records[record].addLockRequest(transactionId, LockType.READ)
+            self.records[record].addLockRequest(transactionId, LockType.READ, startTime)
+            self.transactionRecords.setdefault(transactionId, {})[record] = None
 
-    def requestWriteLock(self, transactionId, record):
+    def requestWriteLock(self, transactionId, record, startTime=None):
         """
-        transaction requests a write lock on record.
+        transaction requests a write lock on record, startTime is its start time.
         """
         if self.status == DataManagerStatus.FAILED:
             return
 
         if record in self.records:
-            self.records[record].addLockRequest(transactionId, LockType.WRITE)
+            self.records[record].addLockRequest(transactionId, LockType.WRITE, startTime)
+            self.transactionRecords.setdefault(transactionId, {})[record] = None
+
+    def tryWriteLock(self, transactionId, record, startTime=None):
+        """
+        requests a write lock on record if it can be written to this site.
+        Returns None if it cant be written here, otherwise if the lock is aquired.
+        """
+        if not self.isWriteOKForRWTrans(record):
+            return None
+        self.requestWriteLock(transactionId, record, startTime)
+        return self.isWriteLockAquired(transactionId, record)
+
+    def queuedLocks(self, record):
+        """
+        the number of lock requests on record, used to spread the reads over the replicas.
+        """
+        if self.status == DataManagerStatus.FAILED or record not in self.records:
+            return 0
+        return len(self.records[record].locks)
 
     def isReadLockAquired(self, transactionId, record):
         """
@@ -145,6 +186,16 @@ class DataManager:
 
         if record in self.records:
             self.records[record].insertNewVersion(value, transactionId, commitTime)
+            self.gcCandidates[record] = None
+            self.transactionRecords.setdefault(transactionId, {})[record] = None
+
+    def addWaiter(self, record, operation):
+        """
+        registers a blocked operation on the record of this site,
+        it is woken up once the record or the site changes.
+        """
+        if record in self.records:
+            self.records[record].addWaiter(operation)
 
     def fail(self, failureTime):
         """
@@ -157,54 +208,211 @@ class DataManager:
             raise Exception("InputError: Site {} is already failed".format(self.dataManagerId))
             exit()
         
+        self.markFailed(failureTime)
+        if self.log is not None:
+            self.log.appendEvent("fail", failureTime)
+
+    def markFailed(self, failureTime):
+        """
+        marks this site as failed at failureTime without logging it, also used by replay.
+        """
         self.status = DataManagerStatus.FAILED
         self.failedTimes.append(failureTime)
         for record in self.records.values():
             record.fail()
+        self.transactionRecords = {}
 
 
-    def recover(self):
+    def recover(self, recoveryTime):
         """
         recovers the data site.
         """
         if self.status == DataManagerStatus.FAILED:
-            self.status = DataManagerStatus.LIVE
+            self.markLive()
+            if self.log is not None:
+                self.log.appendEvent("recover", recoveryTime)
         else:
             raise Exception("InputError: Site {} is already live.".format(self.dataManagerId))
 
+    def markLive(self):
+        """
+        marks this site as live again without logging it and wakes up the waiting operations.
+        """
+        self.status = DataManagerStatus.LIVE
+        for record in self.records.values():
+            record.wakeWaiters()
+
+    def isFailed(self):
+        """
+        check to see if this site is failed.
+        """
+        return self.status == DataManagerStatus.FAILED
+
     def dump(self):
         """
-        print all the record/values in this data site.
+        returns all the (record, latest committed value) pairs in this data site.
         """
-        result = []
-        for recordId, record in self.records.items():
-            result.append("x"+ str(recordId) + ":" + str(record.getLatestCommittedData()))
-        print("Site " + str(self.dataManagerId) + ": " + " ".join(result))
+        return [(recordId, record.getLatestCommittedData()) for recordId, record in self.records.items()]
 
     def removeUncommittedDataForTrans(self, transactionId):
         """
         remove uncommitted data of a trans if the trans aborts.
         """
-        for record in self.records.values():
-            record.removeUncommittedVersionForTrans(transactionId)
+        for record in self.transactionRecords.get(transactionId, ()):
+            self.records[record].removeUncommittedVersionForTrans(transactionId)
     
     def removeLocksForTrans(self, transactionId):
         """
         remove locks of a trans if the trans ends.
+        this is the last thing done for a trans, so it also forgets the records it touched.
         """
-        for record in self.records.values():
-            record.removeLocksForTrans(transactionId)
+        for record in self.transactionRecords.pop(transactionId, ()):
+            self.records[record].removeLocksForTrans(transactionId)
 
-    def commitTransaction(self, transactionId, commitTime):
+    def commitTransaction(self, transactionId, commitTime, writes=None):
         """
         commit all the uncommitted versions of data of a trans when it ends.
+        writes maps the records a trans has buffered its writes of to their values,
+        they are written first to the ones it holds the write lock of on this site.
         """
         # TODO: Make sure all operations are happening only when dm is alive and not failed.
         if self.status == DataManagerStatus.FAILED:
             return
 
-        for record in self.records.values():
-            record.commitTransaction(transactionId, commitTime)
+        if writes:
+            for record, value in writes.items():
+                if self.isWriteLockAquired(transactionId, record):
+                    self.writeRecord(record, value, transactionId)
+
+        for record in self.transactionRecords.get(transactionId, ()):
+            for version in self.records[record].commitTransaction(transactionId, commitTime):
+                if self.log is not None:
+                    self.log.append(record, version)
+
+    def flushLog(self):
+        """
+        syncs the versions committed since the last flush to the write-ahead log.
+        """
+        if self.log is not None:
+            self.log.flush()
+
+    def replayLog(self, sinceTime=0):
+        """
+        rebuilds the committed versions of the records from the write-ahead log,
+        skipping the versions committed at or before sinceTime as those are
+        already in the checkpoint.
+        The failures and recoveries of the site are replayed too, so a site comes
+        back failed if it was, and a replicated record it missed writes to stays
+        unreadable until a version is committed to it again.
+        Returns the latest time found in the log, or sinceTime if there is none.
+        """
+        latestCommitTime = sinceTime
+        if self.log is None:
+            return latestCommitTime
+        for record, data, transactionId, commitTime in self.log.replay():
+            if commitTime <= sinceTime:
+                continue
+            if record == "fail":
+                if self.status == DataManagerStatus.LIVE:
+                    self.markFailed(commitTime)
+            elif record == "recover":
+                if self.status == DataManagerStatus.FAILED:
+                    self.markLive()
+            elif record in self.records:
+                self.records[record].insertNewVersion(data, transactionId, commitTime)
+                self.records[record].recovered = True
+                self.gcCandidates[record] = None
+            else:
+                continue
+            latestCommitTime = max(latestCommitTime, commitTime)
+        return latestCommitTime
+
+    def checkpoint(self, path, time):
+        """
+        writes the latest committed values, status and failure history of this site into
+        a checkpoint file and truncates the write-ahead log, which only has to
+        hold the versions committed after the checkpoint from now on.
+        """
+        self.flushLog()
+        writeCheckpoint(path, self, time)
+        if self.log is not None:
+            self.log.truncate()
+
+    def loadCheckpoint(self, path):
+        """
+        restores the committed values, status and failure history of this site
+        and which of its records are recovered from a checkpoint file.
+        Returns the time of the checkpoint, or 0 if there is none.
+        """
+        checkpoint = readCheckpoint(path)
+        if checkpoint is None:
+            return 0
+        time, self.failedTimes, failed, versions = checkpoint
+        if failed:
+            self.status = DataManagerStatus.FAILED
+        for record, data, transactionId, commitTime, recovered in versions:
+            if record not in self.records:
+                continue
+            if commitTime > 0:
+                self.records[record].insertNewVersion(data, transactionId, commitTime)
+                self.gcCandidates[record] = None
+            self.records[record].recovered = recovered
+        return time
+
+    def versionChainLengths(self):
+        """
+        the number of versions of every record of this site.
+        """
+        return [len(record.versions) for record in self.records.values()]
+
+    def latestCommitTime(self, record):
+        """
+        the commit time of the latest committed version of record on this site,
+        or None if this site is failed or does not hold record.
+        """
+        if self.status == DataManagerStatus.FAILED or record not in self.records:
+            return None
+        return self.records[record].commitTimes[-1]
+
+    def staleRecords(self):
+        """
+        the (record, latest commit time) of the replicated records that can not be
+        read since this site recovered, as no write has been committed to them yet.
+        """
+        return [(recordId, record.commitTimes[-1]) for recordId, record in self.records.items() if not record.recovered]
+
+    def committedVersionsSince(self, record, sinceTime):
+        """
+        the committed versions of record newer than sinceTime, as
+        (data, transactionId, commitTime) oldest first, for a stale replica to catch up.
+        Returns None if the record is not up to date on this site, or this site failed
+        after sinceTime and may have missed some of the versions, and False if a
+        transaction has a pending write on it, which would never reach the stale replica.
+        """
+        if self.status == DataManagerStatus.FAILED or record not in self.records or not self.records[record].recovered:
+            return None
+        if self.failedBetween(sinceTime, float("inf")):
+            return None
+        if self.records[record].locks.writeRequests:
+            return False
+        position = bisect_right(self.records[record].commitTimes, sinceTime)
+        return [(version.data, version.transactionId, version.commitTime) \
+            for version in self.records[record].committedVersions[position:]]
+
+    def catchUp(self, record, versions):
+        """
+        applies the versions copied from an up to date replica to a stale record,
+        which can be read again afterwards.
+        Returns the number of versions added.
+        """
+        if self.status == DataManagerStatus.FAILED or self.records[record].recovered:
+            return 0
+        added = self.records[record].catchUp(versions)
+        for version in added:
+            if self.log is not None:
+                self.log.append(record, version)
+        self.gcCandidates[record] = None
+        return len(added)
 
     def getBlockingRelations(self):
         """
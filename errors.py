@@ -0,0 +1,62 @@
+import output as events
+
+class DatabaseError(Exception):
+    """
+    Base of the errors the database raises instead of exiting.
+    event is the event the text output writes for it, args are its arguments.
+    """
+    event = None
+
+    def __str__(self):
+        if self.event is None:
+            return super().__str__()
+        return self.event.format(self.args)
+
+class InputError(DatabaseError):
+    """
+    an operation that can not be executed, nothing of it has been executed.
+    lineError is set if the text output names the input line before the error.
+    """
+    lineError = False
+
+class TransactionExistsError(InputError):
+    event = events.TRANSACTION_EXISTS
+    lineError = True
+
+class UnknownTransactionError(InputError):
+    event = events.UNKNOWN_TRANSACTION
+    lineError = True
+
+class SiteOutOfRangeError(InputError):
+    event = events.SITE_OUT_OF_RANGE
+    lineError = True
+
+class RecordOutOfRangeError(InputError):
+    event = events.RECORD_OUT_OF_RANGE
+
+class SiteStateError(InputError):
+    event = events.SITE_STATE
+
+class ReadOnlyWriteError(InputError):
+    event = events.WRITE_ON_READ_ONLY
+
+class OperationAfterEndError(InputError):
+    event = events.OPERATION_AFTER_END
+
+class PendingOperationsError(InputError):
+    event = events.PENDING_AT_END
+
+class TransactionAborted(DatabaseError):
+    """
+    the transaction has been aborted, args are its id and the reason, one of
+    "deadlock", "deadlockPrevention", "siteFailure", "writeConflict" or the
+    reason it was aborted for on request.
+    """
+
+    def __init__(self, transactionId, reason):
+        super().__init__(transactionId, reason)
+        self.transactionId = transactionId
+        self.reason = reason
+
+    def __str__(self):
+        return "{} was aborted: {}".format(self.transactionId, self.reason)
@@ -0,0 +1,91 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+
+# python3 loadclient.py --port 7000 --connections 32 --transactions 100
+# every connection runs transactions against a running server.py, one command
+# at a time, and the end to end throughput and latency are printed as JSON.
+
+async def command(reader, writer, line):
+    """
+    sends a single command and waits until it has completed.
+    Returns the status, OK, DONE, ABORTED or ERROR.
+    """
+    writer.write((line + "\n").encode())
+    await writer.drain()
+    waiting = False
+    while True:
+        response = (await reader.readline()).decode()
+        if not response:
+            raise ConnectionError("the server closed the connection")
+        if response.startswith("WAITING"):
+            waiting = True
+        elif (response.startswith("DONE") or response.startswith("ABORTED")) and waiting:
+            return response.split()[0]
+        elif response.startswith("OK") or response.startswith("ERROR"):
+            return response.split()[0]
+
+async def runConnection(connectionId, arguments, latencies, counts):
+    if arguments.unix is not None:
+        reader, writer = await asyncio.open_unix_connection(arguments.unix)
+    else:
+        reader, writer = await asyncio.open_connection(arguments.host, arguments.port)
+    rng = random.Random(arguments.seed * 100003 + connectionId)
+    for i in range(arguments.transactions):
+        transactionId = "C{}T{}".format(connectionId, i)
+        readOnly = rng.random() < arguments.read_only
+        lines = ["beginRO({})".format(transactionId) if readOnly else "begin({})".format(transactionId)]
+        for j in range(arguments.length):
+            record = rng.randint(1, arguments.records)
+            if readOnly or rng.random() < arguments.read_fraction:
+                lines.append("R({},x{})".format(transactionId, record))
+            else:
+                lines.append("W({},x{},{})".format(transactionId, record, i))
+        lines.append("end({})".format(transactionId))
+        for line in lines:
+            started = time.perf_counter()
+            status = await command(reader, writer, line)
+            latencies.append(time.perf_counter() - started)
+            counts[status] = counts.get(status, 0) + 1
+    writer.write(b"quit\n")
+    await writer.drain()
+    writer.close()
+
+async def main(arguments):
+    latencies = []
+    counts = {}
+    started = time.perf_counter()
+    await asyncio.gather(*(runConnection(i, arguments, latencies, counts) for i in range(arguments.connections)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    def percentile(fraction):
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+    return {
+        "config": vars(arguments),
+        "commands": len(latencies),
+        "seconds": elapsed,
+        "commandsPerSecond": len(latencies) / elapsed,
+        "statuses": counts,
+        "latencyMs": {
+            "p50": percentile(0.5) * 1000,
+            "p99": percentile(0.99) * 1000,
+            "p999": percentile(0.999) * 1000,
+            "max": latencies[-1] * 1000,
+        },
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load generator for server.py.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7000)
+    parser.add_argument("--unix", default=None, help="Connect to this unix socket instead of tcp.")
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--transactions", type=int, default=50, help="Transactions per connection.")
+    parser.add_argument("--length", type=int, default=4, help="Reads and writes per transaction.")
+    parser.add_argument("--read-fraction", type=float, default=0.5)
+    parser.add_argument("--read-only", type=float, default=0.2)
+    parser.add_argument("--records", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    print(json.dumps(asyncio.run(main(parser.parse_args())), indent=2))
@@ -1,10 +1,48 @@
 import argparse
-from transactionManager import TransactionManager
+import json
+import sys
+from transactionManager import TransactionManager, VICTIM_POLICIES
+from readrouting import READ_POLICIES
+from output import TextSink, JsonSink, LEVELS
+from waitforgraph import PREVENTION_POLICIES
+from transactions import ISOLATION_LEVELS
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="RepCRec - A Replicated & Concurrent Database.")
     parser.add_argument("inputFileName", nargs="?", default=None, help="A text file or leave empty to read from stdin.")
+    parser.add_argument("--sites", dest="numOfSites", type=int, default=10, help="Number of sites.")
+    parser.add_argument("--records", dest="numOfRecords", type=int, default=20, help="Number of records.")
+    parser.add_argument("--victim-policy", dest="victimPolicy", default="youngest", choices=sorted(VICTIM_POLICIES), help="Which transaction of a deadlock gets aborted.")
+    parser.add_argument("--log-dir", dest="logDirectory", default=None, help="Directory for the write-ahead logs of the sites, committed data is only kept in memory if not given.")
+    parser.add_argument("--no-group-commit", dest="groupCommit", action="store_false", help="Sync the write-ahead log on every commit instead of once per tick.")
+    parser.add_argument("--checkpoint-interval", dest="checkpointInterval", type=int, default=None, help="Checkpoint the sites into the log directory every this many ticks.")
+    parser.add_argument("--stats", action="store_true", help="Print the instrumentation report to stderr at the end.")
+    parser.add_argument("--profile", default=None, metavar="FIRST:LAST", help="Capture a cProfile of the ticks FIRST to LAST into the stats report.")
+    parser.add_argument("--site-processes", dest="siteProcesses", action="store_true", help="Run every site in its own process.")
+    parser.add_argument("--kill-on-fail", dest="killOnFail", action="store_true", help="With --site-processes, fail kills the site process and recover restarts it.")
+    parser.add_argument("--read-policy", dest="readPolicy", default="first", choices=sorted(READ_POLICIES), help="Which replica serves a read of a replicated record.")
+    parser.add_argument("--output", default="text", choices=["text", "json"], help="Write the events as text or as json lines.")
+    parser.add_argument("--verbosity", default="all", choices=sorted(LEVELS, key=LEVELS.get), help="Which events are written, quiet writes none.")
+    parser.add_argument("--deadlock-prevention", dest="deadlockPrevention", default=None, choices=sorted(PREVENTION_POLICIES), help="Prevent deadlocks by the start times of the transactions instead of detecting them.")
+    parser.add_argument("--resync-records-per-tick", dest="resyncRecordsPerTick", type=int, default=0, help="Let a recovered site catch up this many stale replicated records per tick, 0 turns it off.")
+    parser.add_argument("--isolation", default="2pl", choices=sorted(ISOLATION_LEVELS), help="Isolation of the read write transactions, strict two phase locking or snapshot isolation.")
+    parser.add_argument("--deferred-writes", dest="deferredWrites", action="store_true", help="Buffer the writes of a transaction and only apply them to the sites when it commits.")
     arguments = parser.parse_args()
     
-    transManager = TransactionManager(10, 20, arguments.inputFileName)
-    transManager.run()
\ No newline at end of file
+    transManager = TransactionManager(arguments.numOfSites, arguments.numOfRecords, arguments.inputFileName, arguments.victimPolicy, \
+        logDirectory=arguments.logDirectory, groupCommit=arguments.groupCommit, \
+        checkpointInterval=arguments.checkpointInterval, stats=arguments.stats, \
+        profileTicks=tuple(int(tick) for tick in arguments.profile.split(":")) if arguments.profile else None, \
+        siteProcesses=arguments.siteProcesses, killOnFail=arguments.killOnFail, readPolicy=arguments.readPolicy, \
+        output=(JsonSink if arguments.output == "json" else TextSink)(level=LEVELS[arguments.verbosity]), \
+        deadlockPrevention=arguments.deadlockPrevention, resyncRecordsPerTick=arguments.resyncRecordsPerTick, \
+        isolation=arguments.isolation, deferredWrites=arguments.deferredWrites)
+    try:
+        transManager.run()
+    finally:
+        if arguments.stats or arguments.profile:
+            stats = transManager.getStats()
+            profile = stats.pop("profile", None)
+            print(json.dumps(stats, indent=2), file=sys.stderr)
+            if profile:
+                print(profile, file=sys.stderr)
\ No newline at end of file
@@ -0,0 +1,59 @@
+import sys
+import tracemalloc
+from record import RecordVersion, Lock, LockType
+from operations import ReadOp, WriteOp, EndOp
+
+# python3 membench.py 100000
+# prints the bytes allocated per object for the structures that are kept in memory,
+# with __slots__ as they are and backed by a __dict__ as they were before, and the saving.
+
+# Transaction ids are shared by many objects, so they are built before measuring.
+TRANSACTION_IDS = ["T" + str(i) for i in range(100)]
+
+def bytesPerObject(build, count):
+    """
+    builds count objects and returns the number of bytes allocated per object.
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = build(count)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return (after - before) / count
+
+def dictBacked(cls):
+    """
+    an equivalent of cls that keeps its attributes in a __dict__, like it did before
+    __slots__ was added, built by the same __init__.
+    """
+    return type("Dict" + cls.__name__, (), {"__init__": cls.__init__})
+
+def buildVersions(count, versionClass=RecordVersion):
+    return [versionClass(i, TRANSACTION_IDS[i % 100], i + 1) for i in range(count)]
+
+def buildLocks(count, lockClass=Lock):
+    return [lockClass(TRANSACTION_IDS[i % 100], LockType.READ) for i in range(count)]
+
+def buildOperations(count, readClass=ReadOp, writeClass=WriteOp, endClass=EndOp):
+    operations = []
+    for i in range(count // 3):
+        operations.append(readClass(TRANSACTION_IDS[i % 100], "x2"))
+        operations.append(writeClass(TRANSACTION_IDS[i % 100], "x2", "7"))
+        operations.append(endClass(TRANSACTION_IDS[i % 100]))
+    return operations
+
+def compare(name, build, dictBuild, count):
+    slots = bytesPerObject(build, count)
+    dicts = bytesPerObject(dictBuild, count)
+    print("{:<10} {:>8.1f} {:>8.1f} {:>7.1f}%".format(name, slots, dicts, 100 * (dicts - slots) / dicts))
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    count -= count % 3
+    print("{:<10} {:>8} {:>8} {:>8}".format("bytes per", "slots", "dict", "saved"))
+    DictVersion, DictLock = dictBacked(RecordVersion), dictBacked(Lock)
+    DictReadOp, DictWriteOp, DictEndOp = dictBacked(ReadOp), dictBacked(WriteOp), dictBacked(EndOp)
+    compare("version", buildVersions, lambda count: buildVersions(count, DictVersion), count)
+    compare("lock", buildLocks, lambda count: buildLocks(count, DictLock), count)
+    compare("operation", buildOperations, lambda count: buildOperations(count, DictReadOp, DictWriteOp, DictEndOp), count)
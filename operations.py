@@ -1,71 +1,155 @@
 from enum import Enum
+from sys import intern
 
 class OperationStatus(Enum):
     IN_PROGRESS = 1
     COMPLETED = 2
 
+def recordId(record):
+    """
+    the id of a record given either as its id or as its name, like x2.
+    """
+    return record if isinstance(record, int) else int(record[1:])
+
 class BeginOp:
+    __slots__ = ("transactionId", "sequence")
+
     def __init__(self, transactionId):
-        self.transactionId = transactionId
+        self.transactionId = intern(transactionId)
+        self.sequence = None
 
     def __str__(self):
         return "begin({})".format(str(self.transactionId))
 
 class BeginROOp:
+    __slots__ = ("transactionId", "sequence")
+
     def __init__(self, transactionId):
-        self.transactionId = transactionId
+        self.transactionId = intern(transactionId)
+        self.sequence = None
     
     def __str__(self):
         return "beginRO({})".format(str(self.transactionId))
 
 class ReadOp:
+    """
+    result is (site, value) once the read has been served.
+    """
+    __slots__ = ("transactionId", "record", "status", "firstAttempt", "sequence", "result")
+
     def __init__(self, transactionId, record):
-        self.transactionId = transactionId
-        self.record = int(record[1:])
+        self.transactionId = intern(transactionId)
+        self.record = recordId(record)
+        self.result = None
         self.status = OperationStatus.IN_PROGRESS
         self.firstAttempt = True
+        self.sequence = None
 
     def __str__(self):
         return "R({},{})".format(str(self.transactionId), "x" + str(self.record))
 
 class WriteOp:
+    """
+    result is the list of sites the value was written to once it has been written.
+    """
+    __slots__ = ("transactionId", "record", "value", "status", "firstAttempt", "sequence", "result")
+
     def __init__(self, transactionId, record, value):
-        self.transactionId = transactionId
-        self.record = int(record[1:])
+        self.transactionId = intern(transactionId)
+        self.record = recordId(record)
         self.value = value
+        self.result = None
         self.status = OperationStatus.IN_PROGRESS
         self.firstAttempt = True
+        self.sequence = None
 
     def __str__(self):
         return "W({},{},{})".format(str(self.transactionId), "x" + str(self.record), str(self.value))
 
+class MultiReadOp:
+    """
+    reads a set of records in one operation, the records are kept sorted so
+    their locks are always requested in the same order.
+    results maps every record read so far to (site, value), it becomes result
+    once all of them have been read.
+    """
+    __slots__ = ("transactionId", "records", "results", "status", "firstAttempt", "sequence", "result")
+
+    def __init__(self, transactionId, records):
+        self.transactionId = intern(transactionId)
+        self.records = sorted(recordId(record) for record in records)
+        self.results = {}
+        self.result = None
+        self.status = OperationStatus.IN_PROGRESS
+        self.firstAttempt = True
+        self.sequence = None
+
+    def __str__(self):
+        return "MR({},{})".format(str(self.transactionId), ",".join("x" + str(record) for record in self.records))
+
+class MultiWriteOp:
+    """
+    writes a set of records in one operation, writes is a list of (record, value),
+    the records are kept sorted so their locks are always requested in the same order.
+    result maps every record to the sites it was written to once they have been written.
+    """
+    __slots__ = ("transactionId", "records", "values", "status", "firstAttempt", "sequence", "result")
+
+    def __init__(self, transactionId, writes):
+        self.transactionId = intern(transactionId)
+        self.values = {recordId(record): value for record, value in writes}
+        self.records = sorted(self.values)
+        self.result = None
+        self.status = OperationStatus.IN_PROGRESS
+        self.firstAttempt = True
+        self.sequence = None
+
+    def __str__(self):
+        return "MW({},{})".format(str(self.transactionId), \
+            ",".join("x{}={}".format(record, self.values[record]) for record in self.records))
+
 class DumpOp:
+    """
+    result maps every site to its list of (record, value), or None if it is killed, once dumped.
+    """
+    __slots__ = ("sequence", "result")
+
     def __init__(self):
-        pass
+        self.sequence = None
+        self.result = None
 
     def __str__(self):
         return "dump()"
 
 class EndOp:
+    __slots__ = ("transactionId", "commitTime", "status", "firstAttempt", "sequence")
+
     def __init__(self, transactionId):
-        self.transactionId = transactionId
+        self.transactionId = intern(transactionId)
         self.commitTime = None
         self.status = OperationStatus.IN_PROGRESS
         self.firstAttempt = True
+        self.sequence = None
     
     def __str__(self):
         return "end({})".format(str(self.transactionId))
 
 class FailOp:
+    __slots__ = ("site", "sequence")
+
     def __init__(self, site):
         self.site = int(site)
+        self.sequence = None
 
     def __str__(self):
         return "fail({})".format(str(self.site))
         
 class RecoverOp:
+    __slots__ = ("site", "sequence")
+
     def __init__(self, site):
         self.site = int(site)
+        self.sequence = None
 
     def __str__(self):
         return "recover({})".format(str(self.site))
\ No newline at end of file
@@ -0,0 +1,127 @@
+import json
+import sys
+
+# Verbosity levels, an event is only written if its level is at most the level of the sink.
+QUIET = 0
+ERRORS = 1
+RESULTS = 2
+ALL = 3
+
+LEVELS = {
+    "quiet": QUIET,
+    "errors": ERRORS,
+    "results": RESULTS,
+    "all": ALL,
+}
+
+class Event:
+    """
+    A kind of event, fields name its arguments in the json output and
+    template formats them in the text output.
+    """
+    __slots__ = ("name", "level", "fields", "template")
+
+    def __init__(self, name, level, fields, template):
+        self.name = name
+        self.level = level
+        self.fields = fields
+        self.template = template
+
+    def format(self, args):
+        return self.template.format(*args)
+
+class DumpEvent(Event):
+    """
+    the values of a site, args are the site id and a list of (record, value).
+    """
+
+    def format(self, args):
+        siteId, values = args
+        return "Site {}: {}".format(siteId, " ".join("x{}:{}".format(record, value) for record, value in values))
+
+TICK = Event("tick", ALL, ("time",), "---------- Time={} ----------")
+BEGIN = Event("begin", ALL, ("transaction",), "Read Write Transaction {} begins.")
+BEGIN_READ_ONLY = Event("beginReadOnly", ALL, ("transaction",), "Read Only Transaction {} begins.")
+READ = Event("read", RESULTS, ("transaction", "record", "site", "value"), "{} reads x{}.{} => {}")
+WRITE = Event("write", RESULTS, ("transaction", "value", "record", "sites"), "{} wrote {} to x{} in sites-{}")
+WAIT = Event("wait", ALL, ("operation",), "{} will wait.")
+COMMIT = Event("commit", RESULTS, ("transaction",), "{} commits.")
+ABORT_SITE_FAILURE = Event("abortSiteFailure", RESULTS, ("transaction",), "{} aborts due to a site failure.")
+ABORT_DEADLOCK = Event("abortDeadlock", RESULTS, ("transaction",), "{} was aborted due to a deadlock")
+ABORT_WRITE_CONFLICT = Event("abortWriteConflict", RESULTS, ("transaction",), "{} aborts due to a write conflict.")
+ABORT_PREVENTION = Event("abortPrevention", RESULTS, ("transaction",), "{} was aborted to prevent a deadlock")
+DEADLOCK_DETECTED = Event("deadlockDetected", ALL, (), "Deadlock Detected")
+SKIPPED_AFTER_DEADLOCK = Event("skippedAfterDeadlock", ALL, ("transaction", "operation"), \
+    "{} has already been aborted due to a deadlock, so operation {} wont be executed.")
+END_AFTER_DEADLOCK = Event("endAfterDeadlock", RESULTS, ("transaction",), "{} was aborted due to a deadlock in the past.")
+SITE_FAILS = Event("siteFails", ALL, ("site",), "Site-{} fails")
+SITE_RECOVERS = Event("siteRecovers", ALL, ("site",), "Site-{} recovers")
+DUMP = DumpEvent("dump", RESULTS, ("site", "values"), None)
+SITE_KILLED = Event("siteKilled", RESULTS, ("site",), "Site {}: killed")
+PARSE_ERROR = Event("parseError", ERRORS, ("error",), "{}")
+LINE_ERROR = Event("lineError", ERRORS, ("lineNumber", "line"), "Error in input line {} - {}")
+TRANSACTION_EXISTS = Event("transactionExists", ERRORS, ("transaction",), "Transaction name - {} already exists")
+UNKNOWN_TRANSACTION = Event("unknownTransaction", ERRORS, ("transaction",), "Transaction - {} hasnt been begun or is unknown or is ended")
+SITE_OUT_OF_RANGE = Event("siteOutOfRange", ERRORS, ("site", "numOfSites"), "The given site - {} is not in the range 1-{}")
+RECORD_OUT_OF_RANGE = Event("recordOutOfRange", ERRORS, ("record", "numOfRecords"), "The given record - {} is not in the range x1-x{}")
+SITE_STATE = Event("siteState", ERRORS, ("site", "state"), "Site-{} is already {}")
+WRITE_ON_READ_ONLY = Event("writeOnReadOnly", ERRORS, ("operation", "transaction"), \
+    "InputError: Received a write operation - {} on a ReadOnly Transaction {}")
+OPERATION_AFTER_END = Event("operationAfterEnd", ERRORS, ("transaction", "operation"), \
+    "InputError: {} has received an operation {} after the end operation")
+PENDING_AT_END = Event("pendingAtEnd", ERRORS, ("operation", "transaction"), \
+    "InputError: received an {} when there are still operations pending in {}")
+
+class TextSink:
+    """
+    Writes the events in the text format.
+    Events are kept as they are emitted and only formatted when they are written,
+    events above the level are dropped right away, so they cost a method call.
+    The buffer is written out once it holds bufferSize events at the end of a
+    tick, at every tick if the stream is interactive, and on flush. The end of a
+    tick comes after the write-ahead logs are synced, so a commit is only written
+    once it is durable. With bufferSize 0 every event is written as it is emitted,
+    before the sync of its tick.
+    stream defaults to whatever sys.stdout is at the time of writing.
+    """
+
+    def __init__(self, stream=None, level=ALL, bufferSize=4096):
+        self.stream = stream
+        self.level = level
+        self.bufferSize = bufferSize
+        self.buffer = []
+        target = stream or sys.stdout
+        self.interactive = hasattr(target, "isatty") and target.isatty()
+
+    def emit(self, event, *args):
+        if event.level <= self.level:
+            self.buffer.append((event, args))
+            if self.bufferSize == 0:
+                self.flush()
+
+    def endTick(self):
+        if self.interactive or len(self.buffer) >= self.bufferSize:
+            self.flush()
+
+    def format(self, event, args):
+        return event.format(args)
+
+    def flush(self):
+        if not self.buffer:
+            return
+        buffer = self.buffer
+        self.buffer = []
+        stream = self.stream or sys.stdout
+        stream.write("".join(self.format(event, args) + "\n" for event, args in buffer))
+        stream.flush()
+
+class JsonSink(TextSink):
+    """
+    Writes every event as one json object per line, with the event name and its fields.
+    """
+
+    def format(self, event, args):
+        record = {"event": event.name}
+        for field, value in zip(event.fields, args):
+            record[field] = value if isinstance(value, (int, float, list)) else str(value)
+        return json.dumps(record)
@@ -0,0 +1,65 @@
+from array import array
+from heapq import merge
+
+class PlacementDirectory:
+    """
+    Maps every record to the sites it lives on, computed once and shared by all sites.
+    Even numbered records are replicated on every site, an odd numbered record i
+    lives only on site 1 + (i % numOfSites).
+    It also tracks which sites are failed, so that reads and writes only visit
+    the live sites that hold their record.
+    """
+
+    def __init__(self, numOfSites, numOfRecords):
+        """
+        homeSite holds the only site of every non replicated record and 0 for the
+        replicated ones, indexed by record id.
+        siteRecords holds the ids of the non replicated records of every site, in order.
+        failedSites are the ids of the sites that are currently failed.
+        """
+        self.numOfSites = numOfSites
+        self.numOfRecords = numOfRecords
+        self.homeSite = array("l", [0]) * (numOfRecords + 1)
+        self.siteRecords = {siteId: array("l") for siteId in range(1, numOfSites + 1)}
+        for record in range(1, numOfRecords + 1, 2):
+            siteId = 1 + (record % numOfSites)
+            self.homeSite[record] = siteId
+            self.siteRecords[siteId].append(record)
+        self.failedSites = set()
+
+    def isValidRecord(self, record):
+        return 1 <= record <= self.numOfRecords
+
+    def isValidSite(self, siteId):
+        return 1 <= siteId <= self.numOfSites
+
+    def isReplicated(self, record):
+        return self.homeSite[record] == 0
+
+    def sitesFor(self, record):
+        """
+        the ids of the sites that hold the record, in increasing order.
+        """
+        if self.isReplicated(record):
+            return range(1, self.numOfSites + 1)
+        return (self.homeSite[record],)
+
+    def liveSitesFor(self, record):
+        """
+        the ids of the live sites that hold the record, in increasing order.
+        """
+        if not self.failedSites:
+            return self.sitesFor(record)
+        return [siteId for siteId in self.sitesFor(record) if siteId not in self.failedSites]
+
+    def markFailed(self, siteId):
+        self.failedSites.add(siteId)
+
+    def markLive(self, siteId):
+        self.failedSites.discard(siteId)
+
+    def recordsAt(self, siteId):
+        """
+        the ids of the records that live on the site, in increasing order.
+        """
+        return merge(range(2, self.numOfRecords + 1, 2), self.siteRecords[siteId])
@@ -0,0 +1,87 @@
+import random
+from collections import Counter
+
+class FirstSite:
+    """
+    Decides in which order the live replicas of a record are tried by a read,
+    the first one that can serve the read does.
+    This policy always tries them in site order, so the reads of a replicated
+    record all land on the lowest live site.
+    readCounts counts the reads served by every site.
+    """
+
+    def __init__(self, dataManagers, seed=0):
+        self.dataManagers = dataManagers
+        self.readCounts = Counter()
+
+    def order(self, sites, record, transaction):
+        return sites
+
+    def served(self, siteId):
+        self.readCounts[siteId] += 1
+
+class RoundRobin(FirstSite):
+    """
+    every read starts from the replica after the one the previous read started from.
+    """
+
+    def __init__(self, dataManagers, seed=0):
+        super().__init__(dataManagers, seed)
+        self.next = 0
+
+    def order(self, sites, record, transaction):
+        if len(sites) <= 1:
+            return sites
+        start = self.next % len(sites)
+        self.next += 1
+        return list(sites[start:]) + list(sites[:start])
+
+class LeastQueuedLocks(RoundRobin):
+    """
+    the replicas with the fewest lock requests on the record are tried first,
+    ties are broken round robin.
+    """
+
+    def order(self, sites, record, transaction):
+        if len(sites) <= 1:
+            return sites
+        return sorted(super().order(sites, record, transaction), key=lambda siteId: self.dataManagers[siteId].queuedLocks(record))
+
+class TwoChoices(FirstSite):
+    """
+    two random replicas are compared and the one with fewer lock requests on
+    the record is tried first, then the other one, then the rest in site order.
+    """
+
+    def __init__(self, dataManagers, seed=0):
+        super().__init__(dataManagers, seed)
+        self.rng = random.Random(seed)
+
+    def order(self, sites, record, transaction):
+        if len(sites) <= 1:
+            return sites
+        first, second = self.rng.sample(list(sites), 2)
+        if self.dataManagers[second].queuedLocks(record) < self.dataManagers[first].queuedLocks(record):
+            first, second = second, first
+        return [first, second] + [siteId for siteId in sites if siteId != first and siteId != second]
+
+class Affinity(RoundRobin):
+    """
+    the replicas on sites the transaction has already touched are tried first,
+    so a site failure can abort it for fewer reasons, the rest round robin.
+    """
+
+    def order(self, sites, record, transaction):
+        ordered = super().order(sites, record, transaction)
+        if not transaction.dataManagersTouched:
+            return ordered
+        return sorted(ordered, key=lambda siteId: siteId not in transaction.dataManagersTouched)
+
+# Maps a read policy name to the class that orders the replicas of a read.
+READ_POLICIES = {
+    "first": FirstSite,
+    "round-robin": RoundRobin,
+    "least-locks": LeastQueuedLocks,
+    "two-choices": TwoChoices,
+    "affinity": Affinity,
+}
@@ -1,4 +1,5 @@
-from collections import deque
+from bisect import bisect_right
+from collections import Counter, deque
 from enum import Enum
 
 class LockType(Enum):
@@ -9,6 +10,7 @@ class Lock:
     """
     This class represents either a read/write lock request for a particular transaction.
     """
+    __slots__ = ("transactionId", "lockType")
 
     def __init__(self, transactionId, lockType):
         self.transactionId = transactionId
@@ -17,13 +19,228 @@ class Lock:
     def __str__(self):
         return "{}.W".format(self.transactionId) if self.lockType == LockType.WRITE else "{}.R".format(self.transactionId)
 
+class LockTable:
+    """
+    The lock table of a single record.
+    Lock requests are granted in the order they arrive, the granted ones are kept
+    in holders and the rest wait in a FIFO queue. A lock request is only granted
+    once every request that arrived before it has been granted, so acquiring,
+    testing and releasing a lock never has to scan the whole queue.
+    The table also reports the blocking relations between the requests to the
+    wait-for graph, the request that arrives later waits on the earlier one unless
+    both are read requests or both belong to the same transaction.
+    """
+
+    def __init__(self, waitForGraph=None):
+        """
+        holders - transaction id to the strongest granted LockType of that transaction.
+        grantedMode - LockType.WRITE if a transaction holds the write lock, LockType.READ
+        if only read locks are granted and None if nothing is granted.
+        waiting - FIFO queue of the Lock requests that are not granted yet, requests of
+        transactions that have released their locks are skipped lazily.
+        waitingLocks - transaction id to the list of its Lock requests in waiting.
+        requests - transaction id to the list of all its Lock requests on this record.
+        writeRequests - transaction id to the arrival sequence of its write lock request,
+        in arrival order.
+        blockedBy - transaction id to a Counter of the transactions it waits on.
+        blocks - transaction id to a Counter of the transactions waiting on it.
+        startTimes - transaction id to the start time given with its requests, used
+        by the deadlock prevention of the waitForGraph.
+        """
+        self.holders = {}
+        self.grantedMode = None
+        self.waiting = deque([])
+        self.waitingLocks = {}
+        self.requests = {}
+        self.writeRequests = {}
+        self.nextSequence = 0
+        self.blockedBy = {}
+        self.blocks = {}
+        self.startTimes = {}
+        self.waitForGraph = waitForGraph
+
+    def __len__(self):
+        return sum(len(locks) for locks in self.requests.values())
+
+    def request(self, transactionId, lockType, startTime=None):
+        """
+        Adds a read lock request if there already isnt a read/write lock
+        request present for the same transaction.
+        Adds a write lock request if there already isnt a write lock request
+        present for the same transaction.
+        If the waitForGraph prevents deadlocks and the request would have to wait,
+        the graph decides by startTime whether it is queued or dropped.
+        """
+        if lockType == LockType.READ and transactionId in self.requests:
+            return
+        if lockType == LockType.WRITE and transactionId in self.writeRequests:
+            return
+
+        if startTime is not None and self.waitForGraph is not None and self.waitForGraph.prevention is not None:
+            if lockType == LockType.READ:
+                conflicting = {writer: self.startTimes[writer] for writer in self.writeRequests if writer in self.startTimes}
+            else:
+                conflicting = {holder: self.startTimes[holder] for holder in self.requests \
+                    if holder != transactionId and holder in self.startTimes}
+            if conflicting and not self.waitForGraph.resolveConflict(transactionId, startTime, conflicting):
+                return
+            self.startTimes[transactionId] = startTime
+
+        if lockType == LockType.READ:
+            for writer in self.writeRequests:
+                self.addBlockingEdge(transactionId, writer, 1)
+        else:
+            for holder, locks in self.requests.items():
+                if holder != transactionId:
+                    self.addBlockingEdge(transactionId, holder, len(locks))
+            self.writeRequests[transactionId] = self.nextSequence
+        self.nextSequence += 1
+
+        lock = Lock(transactionId, lockType)
+        self.requests.setdefault(transactionId, []).append(lock)
+        if not self.waiting and self.isGrantable(lock):
+            self.grant(lock)
+        else:
+            self.waiting.append(lock)
+            self.waitingLocks.setdefault(transactionId, []).append(lock)
+
+    def isGrantable(self, lock):
+        """
+        a read request can be granted when nobody holds the write lock,
+        a write request can be granted when nobody else holds a lock.
+        """
+        if lock.lockType == LockType.READ:
+            return self.grantedMode != LockType.WRITE
+        return not self.holders or (len(self.holders) == 1 and lock.transactionId in self.holders)
+
+    def grant(self, lock):
+        """
+        moves a lock request into the holders.
+        """
+        if lock.lockType == LockType.WRITE:
+            self.holders[lock.transactionId] = LockType.WRITE
+            self.grantedMode = LockType.WRITE
+        else:
+            self.holders.setdefault(lock.transactionId, LockType.READ)
+            if self.grantedMode is None:
+                self.grantedMode = LockType.READ
+
+    def promote(self):
+        """
+        grants the waiting requests from the front of the queue for as long as possible.
+        """
+        while self.waiting:
+            lock = self.waiting[0]
+            pending = self.waitingLocks.get(lock.transactionId)
+            if not pending or lock not in pending:
+                self.waiting.popleft()
+                continue
+            if not self.isGrantable(lock):
+                break
+            self.waiting.popleft()
+            pending.remove(lock)
+            if not pending:
+                del self.waitingLocks[lock.transactionId]
+            self.grant(lock)
+
+    def isGranted(self, transactionId, lockType):
+        """
+        A read lock is granted if the first request of the transaction is not
+        behind another transactions write lock request, so a transaction whose
+        write request is only queued behind read locks can still read.
+        A write lock is granted if it is in the holders.
+        """
+        if lockType == LockType.WRITE:
+            return self.holders.get(transactionId) == LockType.WRITE
+        if transactionId in self.holders:
+            return True
+        locks = self.requests.get(transactionId)
+        if not locks or locks[0].lockType != LockType.WRITE:
+            return False
+        ownSequence = self.writeRequests[transactionId]
+        for writer, sequence in self.writeRequests.items():
+            if writer != transactionId:
+                return sequence > ownSequence
+        return True
+
+    def release(self, transactionId):
+        """
+        removes all the lock requests of a transaction and grants the waiting requests
+        that are no longer blocked.
+        Returns False if the transaction had no lock requests on this record.
+        """
+        if transactionId not in self.requests:
+            return False
+        del self.requests[transactionId]
+        self.writeRequests.pop(transactionId, None)
+        self.startTimes.pop(transactionId, None)
+        self.waitingLocks.pop(transactionId, None)
+
+        for holder, count in self.blockedBy.pop(transactionId, {}).items():
+            self.removeFromGraph(transactionId, holder, count)
+            waiters = self.blocks[holder]
+            del waiters[transactionId]
+            if not waiters:
+                del self.blocks[holder]
+        for waiter, count in self.blocks.pop(transactionId, {}).items():
+            self.removeFromGraph(waiter, transactionId, count)
+            holders = self.blockedBy[waiter]
+            del holders[transactionId]
+            if not holders:
+                del self.blockedBy[waiter]
+
+        if transactionId in self.holders:
+            del self.holders[transactionId]
+            if not self.holders:
+                self.grantedMode = None
+            elif self.grantedMode == LockType.WRITE:
+                self.grantedMode = LockType.READ
+        self.promote()
+        return True
+
+    def clear(self):
+        """
+        drops every lock request, gets called when the site fails.
+        """
+        for waiter, holders in self.blockedBy.items():
+            for holder, count in holders.items():
+                self.removeFromGraph(waiter, holder, count)
+        self.__init__(self.waitForGraph)
+
+    def addBlockingEdge(self, waiter, holder, count):
+        """
+        records that waiter is blocked by holder on this record.
+        """
+        self.blockedBy.setdefault(waiter, Counter())[holder] += count
+        self.blocks.setdefault(holder, Counter())[waiter] += count
+        if self.waitForGraph is not None:
+            for _ in range(count):
+                self.waitForGraph.addEdge(waiter, holder)
+
+    def removeFromGraph(self, waiter, holder, count):
+        """
+        withdraws count occurrences of the edge waiter -> holder from the wait-for graph.
+        """
+        if self.waitForGraph is not None:
+            for _ in range(count):
+                self.waitForGraph.removeEdge(waiter, holder)
+
+    def getBlockingRelations(self):
+        """
+        If the requests arrived as [T1.R, T2.R, T3.W]
+        Then T1 will block T3 and also T2 will block T3.
+        """
+        return {(waiter, holder) for waiter, holders in self.blockedBy.items() for holder in holders}
+
 class RecordVersion:
     """
     Each record will have versions.
     So that we can facilitate Multiversion Reads.
     And also to store temporary data as a new version which hasnt commited yet.
     Each object of this calss represents a single version of the record.
+    There can be millions of versions, so they have no __dict__.
     """
+    __slots__ = ("data", "transactionId", "commitTime")
 
     def __init__(self, data, transactionId, commitTime = None):
         """
@@ -37,70 +254,104 @@ class RecordVersion:
 
 class Record:
     """
-    Each object of this class is one of the 20 records.
+    Each object of this class is one of the records.
     It facilitates versioning, locking, failure, and recovery.
     """
 
-    def __init__(self, initialValue, replicated= False):
+    def __init__(self, initialValue, replicated= False, waitForGraph=None, waitQueue=None):
         """
         initialValue - starting value of this record, which is usually 10*recordNumber.
-        replicated - is true for even numbered records.
+        replicated - is true for records that live on every site.
         versions - is a deque of RecordVersion objects, and ones closer to zero index are the 
         most recently added versions.
-        locks - is a deque of Lock objects, and the ones closer to zero index are the ones closer 
-        to getting the lock.
+        locks - is the LockTable of this record, it reports its blocking relations to
+        waitForGraph, the shared WaitForGraph, as lock requests are queued and released.
+        waitQueue - the shared WaitQueue that blocked operations are handed to when
+        this record changes, can be None.
+        waiters - the blocked operations waiting on this record, in the order they registered.
+        commitTimes and committedVersions - the committed versions sorted by commitTime,
+        oldest first, so that snapshot reads can binary search them.
+        collectedHorizon - None until the version garbage collector drops a version,
+        afterwards reads as of a time before this commit time can not be served.
         """
         self.versions = deque([])
         self.recovered = True
-        self.locks = deque([])
+        self.locks = LockTable(waitForGraph)
         self.replicated = replicated
-        self.versions.appendleft(RecordVersion(initialValue, "initialValue", 0))
+        self.waitQueue = waitQueue
+        self.waiters = {}
+        self.commitTimes = []
+        self.committedVersions = []
+        self.collectedHorizon = None
+        self.insertNewVersion(initialValue, "initialValue", 0)
 
     def insertNewVersion(self, data, transactionId, commitTime = None):
         """
         Appends a new version to the zero index of self.versions.
         """
-        self.versions.appendleft(RecordVersion(data, transactionId, commitTime))
+        version = RecordVersion(data, transactionId, commitTime)
+        self.versions.appendleft(version)
+        if commitTime != None:
+            self.indexCommittedVersion(version)
+        self.wakeWaiters()
+
+    def indexCommittedVersion(self, version):
+        """
+        adds a committed version to the commit time index,
+        versions with the same commitTime must be indexed oldest first.
+        """
+        position = bisect_right(self.commitTimes, version.commitTime)
+        self.commitTimes.insert(position, version.commitTime)
+        self.committedVersions.insert(position, version)
 
-    def addLockRequest(self, transactionId, lockType):
+    def getVersionAsOf(self, time):
+        """
+        returns the newest version committed at or before time,
+        or the oldest committed version if there is none.
+        Returns None if that version has already been garbage collected.
+        """
+        position = bisect_right(self.commitTimes, time) - 1
+        if position < 0 and self.collectedHorizon != None:
+            return None
+        return self.committedVersions[max(position, 0)]
+
+    def addWaiter(self, operation):
+        """
+        registers a blocked operation to be woken up when this record changes.
+        """
+        self.waiters[operation] = None
+
+    def wakeWaiters(self):
+        """
+        hands all the operations waiting on this record to the wait queue.
+        gets called whenever the locks, versions or recovered flag change
+        in a way that could let a blocked operation proceed.
+        """
+        if not self.waiters:
+            return
+        if self.waitQueue is not None:
+            for operation in self.waiters:
+                self.waitQueue.wake(operation)
+        self.waiters = {}
+
+    def addLockRequest(self, transactionId, lockType, startTime=None):
         """
         Adds a read lock request to the queue if there already isnt a read/write lock
         request present for the same transaction.
         Adds a write lock request to the queue if there already isnt a write lock request
         present for the same transaction.
+        startTime is the start time of the transaction, used to prevent deadlocks.
         """
-        if lockType == LockType.READ:
-            for lock in self.locks:
-                if lock.transactionId == transactionId:
-                    return
-        else:
-            for lock in self.locks:
-                if lock.transactionId == transactionId and lock.lockType == LockType.WRITE:
-                    return
-        self.locks.append( Lock(transactionId, lockType) )
+        self.locks.request(transactionId, lockType, startTime)
 
     def isLockAquired(self, transactionId, lockType):
         """
-        For a read lock it checks to see if the lock request is at index 0
+        For a read lock it checks to see if the lock request has been granted
         or if the read lock can be shared among transactions.
-        For a write lock it checks to see if the write lock is at index 0
-        or if any other read/write lock is blocking this transactions 
-        write lock.
+        For a write lock it checks to see if the write lock has been granted,
+        which only happens once no other read/write lock is blocking it.
         """
-        if lockType == LockType.READ:
-            for lock in self.locks:
-                if lock.transactionId == transactionId:
-                    return True
-                if lock.transactionId != transactionId and lock.lockType == LockType.WRITE:
-                    return False
-        else:
-            for lock in self.locks:
-                if lock.transactionId == transactionId and lock.lockType == LockType.WRITE:
-                    return True
-                if lock.transactionId != transactionId:
-                    return False
-        
-        return False
+        return self.locks.isGranted(transactionId, lockType)
     
     def removeUncommittedVersionForTrans(self, transactionId):
         """
@@ -114,8 +365,52 @@ class Record:
             else:
                 newVersions.append(version)
 
+        if len(newVersions) != len(self.versions):
+            self.wakeWaiters()
         self.versions = newVersions
 
+    def collectVersions(self, watermark):
+        """
+        drops the committed versions that are older than the newest version committed
+        at or before watermark, no read only transaction starting at or after watermark
+        can read them.
+        Returns the dropped versions.
+        """
+        position = bisect_right(self.commitTimes, watermark) - 1
+        if position <= 0:
+            return []
+
+        collected = self.committedVersions[:position]
+        del self.commitTimes[:position]
+        del self.committedVersions[:position]
+        self.collectedHorizon = self.commitTimes[0]
+        collectedIds = set(id(version) for version in collected)
+        self.versions = deque(version for version in self.versions if id(version) not in collectedIds)
+        return collected
+
+    def catchUp(self, versions):
+        """
+        adds the committed versions copied from an up to date replica that are newer
+        than the latest committed version here, behind any uncommitted versions, and
+        makes the record readable again.
+        versions are (data, transactionId, commitTime), oldest first.
+        Returns the versions that got added, oldest first.
+        """
+        latestCommitTime = self.commitTimes[-1]
+        uncommitted = 0
+        while uncommitted < len(self.versions) and self.versions[uncommitted].commitTime == None:
+            uncommitted += 1
+        added = []
+        for data, transactionId, commitTime in versions:
+            if commitTime > latestCommitTime:
+                version = RecordVersion(data, transactionId, commitTime)
+                self.versions.insert(uncommitted, version)
+                self.indexCommittedVersion(version)
+                added.append(version)
+        self.recovered = True
+        self.wakeWaiters()
+        return added
+
     def removeAllUncommitedVersions(self):
         """
         self.versions stores uncommitted versions, this method removes
@@ -139,7 +434,8 @@ class Record:
         self.removeAllUncommitedVersions()
         if self.replicated:
             self.recovered = False
-        self.locks = deque([])
+        self.locks.clear()
+        self.wakeWaiters()
         
     
     def getLatestData(self):
@@ -152,58 +448,36 @@ class Record:
         """
         this method returns the latest committed data on self.versions.
         """
-        for version in self.versions:
-            if version.commitTime != None:
-                return version.data
+        return self.committedVersions[-1].data
 
     def removeLocksForTrans(self, transactionId):
         """
         remove all the locks for a trans.
         gets called when transaction is ending.
         """
-        newLocks = deque([])
-        for lock in self.locks:
-            if lock.transactionId == transactionId:
-                continue
-            else:
-                newLocks.append(lock)
-        self.locks = newLocks
+        if self.locks.release(transactionId):
+            self.wakeWaiters()
 
     def commitTransaction(self, transactionId, commitTime):
         """
         commits all records for a transaction by setting commitTime.
+        Returns the versions that got committed, oldest first.
         """
+        committed = []
         for version in self.versions:
             if version.commitTime == None and version.transactionId == transactionId:
                 version.commitTime = commitTime
                 self.recovered = True
+                committed.append(version)
+        for version in reversed(committed):
+            self.indexCommittedVersion(version)
+        if committed:
+            self.wakeWaiters()
+        return committed[::-1]
 
     def getBlockingRelations(self):
         """
         If the locks has values [T1.R, T2.R, T3.W]
         Then T1 will block T3 and also T2 will block T3.
         """
-        blockingRelations = set()
-        for current in range(len(self.locks)):
-            for previous in range(current):
-                # print("{} - {} -> {}".format(self.locks[previous], self.locks[current],self.blocking(self.locks[previous],self.locks[current]) ))
-                if self.blocking(self.locks[previous],self.locks[current]):
-                    blockingRelations.add((self.locks[current].transactionId, self.locks[previous].transactionId))
-        return blockingRelations
-
-    def blocking(self, previous, current):
-        """
-        This determines if the previous transaction blocks the current transaction
-        that we are trying to test.
-        Only in cases where both the transactions are read locks or if the lock
-        requests are from the same transaction there wont be blocking.
-        In every other case there will be a block.
-        """
-        if previous.lockType == LockType.READ and current.lockType == LockType.READ:
-            return False
-        if previous.transactionId == current.transactionId:
-            return False
-        
-        return True
-        
-        
+        return self.locks.getBlockingRelations()
@@ -0,0 +1,285 @@
+import os
+import multiprocessing
+from versiongc import VersionGarbageCollector
+from checkpoint import checkpointPath
+from waitforgraph import PREVENTION_POLICIES
+
+# What a DataManager answers when it is failed, a killed site answers the same.
+FAILED_RESULTS = {
+    "isReadOKForRWTrans": False,
+    "readRecordForROTrans": [False, None],
+    "readRecordAsOf": [False, None],
+    "isWriteOKForRWTrans": False,
+    "tryWriteLock": None,
+    "isReadLockAquired": False,
+    "isWriteLockAquired": False,
+    "getBlockingRelations": set(),
+    "versionChainLengths": [],
+    "queuedLocks": 0,
+    "dump": None,
+    "isFailed": True,
+    "staleRecords": [],
+    "committedVersionsSince": None,
+    "latestCommitTime": None,
+}
+
+# The DataManager methods that a RemoteDataManager forwards to its site.
+REMOTE_METHODS = {
+    "isReadOKForRWTrans", "readRecordForROTrans", "readRecordAsOf", "isWriteOKForRWTrans",
+    "tryWriteLock", "requestReadLock", "requestWriteLock", "isReadLockAquired", "isWriteLockAquired",
+    "readRecord", "writeRecord", "dump", "removeUncommittedDataForTrans", "removeLocksForTrans",
+    "commitTransaction", "flushLog", "replayLog", "checkpoint", "loadCheckpoint",
+    "getBlockingRelations", "versionChainLengths", "collectGarbage", "gcStats",
+    "queuedLocks", "staleRecords", "committedVersionsSince", "catchUp",
+    "latestCommitTime", "isFailed",
+}
+
+def fanOut(dataManagers, method, *args):
+    """
+    calls method with args on every dataManager and returns the results in order.
+    The calls to remote sites are all sent before any answer is awaited,
+    so the sites work on them in parallel.
+    """
+    sent = []
+    results = []
+    for dm in dataManagers:
+        if isinstance(dm, RemoteDataManager) and dm.process is not None:
+            dm.send(method, *args)
+            sent.append(dm)
+            results.append(None)
+        else:
+            sent.append(None)
+            results.append(getattr(dm, method)(*args))
+    return [dm.receive() if dm is not None else result for dm, result in zip(sent, results)]
+
+class WaitingOperation:
+    """
+    Stands in for a blocked operation inside a site process, only its sequence crosses the pipe.
+    """
+    __slots__ = ("sequence",)
+
+    def __init__(self, sequence):
+        self.sequence = sequence
+
+class EdgeRecorder:
+    """
+    Stands in for the WaitForGraph inside a site process, the edge changes and
+    the transactions wounded by the deadlock prevention are sent back with every
+    answer and applied to the real graph.
+    """
+
+    def __init__(self, prevention=None):
+        self.changes = []
+        self.prevention = prevention
+        self.wounded = []
+
+    def resolveConflict(self, requester, startTime, conflicting):
+        victims = self.prevention(requester, startTime, conflicting)
+        self.wounded.extend(victims)
+        return requester not in victims
+
+    def drainWounded(self):
+        wounded = self.wounded
+        self.wounded = []
+        return wounded
+
+    def addEdge(self, waiter, holder):
+        self.changes.append((True, waiter, holder))
+
+    def removeEdge(self, waiter, holder):
+        self.changes.append((False, waiter, holder))
+
+    def drain(self):
+        changes = self.changes
+        self.changes = []
+        return changes
+
+class WakeRecorder:
+    """
+    Stands in for the WaitQueue inside a site process, the sequences of the
+    woken up operations are sent back with every answer.
+    """
+
+    def __init__(self):
+        self.woken = []
+
+    def wake(self, operation):
+        self.woken.append(operation.sequence)
+
+    def drain(self):
+        woken = self.woken
+        self.woken = []
+        return woken
+
+def serveSite(connection, dataManagerId, placement, logPath, groupCommit, gcRecordsPerTick, deadlockPrevention):
+    """
+    main loop of a site process, it hosts one DataManager and answers the calls
+    that come through connection with
+    (error, result, edge changes, wounded transactions, woken operations).
+    """
+    from datamanager import DataManager
+    from wal import WriteAheadLog
+
+    edges = EdgeRecorder(PREVENTION_POLICIES.get(deadlockPrevention))
+    woken = WakeRecorder()
+    log = WriteAheadLog(logPath, groupCommit) if logPath is not None else None
+    dm = DataManager(dataManagerId, placement, edges, woken, log)
+    versionGC = VersionGarbageCollector({dataManagerId: dm}, gcRecordsPerTick)
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        method, args = message
+        error, result = None, None
+        try:
+            if method == "addWaiter":
+                dm.addWaiter(args[0], WaitingOperation(args[1]))
+            elif method == "collectGarbage":
+                versionGC.collect(*args)
+            elif method == "gcStats":
+                result = versionGC.getStats()
+            elif method == "failedTimes":
+                result = dm.failedTimes
+            elif method == "restart":
+                failedTimes, recoveryTime = args
+                if not dm.isFailed():
+                    dm.fail(failedTimes[-1])
+                dm.failedTimes = list(failedTimes)
+                dm.recover(recoveryTime)
+            else:
+                result = getattr(dm, method)(*args)
+        except Exception as exception:
+            error = str(exception)
+        connection.send((error, result, edges.drain(), edges.drainWounded(), woken.drain()))
+    if log is not None:
+        log.close()
+
+class RemoteDataManager:
+    """
+    Runs a DataManager in its own process and forwards the calls to it through a pipe.
+    The wait-for graph edges and woken operations of the site come back with every
+    answer and are applied to the waitForGraph and waitQueue of this process.
+    With killOnFail failing the site kills its process and recovering it starts a
+    new one, which rebuilds the committed data from the checkpoint and the log of the
+    site, so it needs a logDirectory.
+    """
+
+    def __init__(self, dataManagerId, placement, operations, waitForGraph, waitQueue, \
+        logDirectory=None, groupCommit=True, gcRecordsPerTick=16, killOnFail=False, deadlockPrevention=None):
+        """
+        operations maps the sequences of the operations of the live transactions of the
+        TransactionManager to them, to map woken up sequences back to operations, the
+        operations of ended transactions are gone and no longer need waking up.
+        waiters are the sequences of the operations registered on the site that have
+        not been woken up yet, a restarted site wakes them all.
+        """
+        if killOnFail and logDirectory is None:
+            raise Exception("InputError: Killing sites on failure needs a log directory")
+        self.dataManagerId = dataManagerId
+        self.placement = placement
+        self.operations = operations
+        self.waitForGraph = waitForGraph
+        self.waitQueue = waitQueue
+        self.logDirectory = logDirectory
+        self.groupCommit = groupCommit
+        self.gcRecordsPerTick = gcRecordsPerTick
+        self.killOnFail = killOnFail
+        self.deadlockPrevention = deadlockPrevention
+        self.waiters = set()
+        self.failedTimes = []
+        self.process = None
+        self.start()
+
+    def start(self):
+        logPath = None
+        if self.logDirectory is not None:
+            logPath = os.path.join(self.logDirectory, "site{}.log".format(self.dataManagerId))
+        self.connection, siteConnection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=serveSite, daemon=True, \
+            args=(siteConnection, self.dataManagerId, self.placement, logPath, self.groupCommit, self.gcRecordsPerTick, \
+                self.deadlockPrevention))
+        self.process.start()
+
+    def send(self, method, *args):
+        self.connection.send((method, args))
+
+    def receive(self):
+        error, result, edgeChanges, wounded, woken = self.connection.recv()
+        for added, waiter, holder in edgeChanges:
+            if added:
+                self.waitForGraph.addEdge(waiter, holder)
+            else:
+                self.waitForGraph.removeEdge(waiter, holder)
+        self.waitForGraph.wounded.extend(wounded)
+        for sequence in woken:
+            self.waiters.discard(sequence)
+            if sequence in self.operations:
+                self.waitQueue.wake(self.operations[sequence])
+        if error is not None:
+            raise Exception(error)
+        return result
+
+    def call(self, method, *args):
+        if self.process is None:
+            return FAILED_RESULTS.get(method)
+        self.send(method, *args)
+        return self.receive()
+
+    def __getattr__(self, method):
+        if method not in REMOTE_METHODS:
+            raise AttributeError(method)
+        return lambda *args: self.call(method, *args)
+
+    def addWaiter(self, record, operation):
+        self.waiters.add(operation.sequence)
+        if self.process is not None:
+            self.call("addWaiter", record, operation.sequence)
+
+    def fail(self, failureTime):
+        if self.process is None:
+            raise Exception("InputError: Site {} is already failed".format(self.dataManagerId))
+        self.call("fail", failureTime)
+        if self.killOnFail:
+            self.failedTimes = self.call("failedTimes")
+            self.process.kill()
+            self.process.join()
+            self.process = None
+
+    def recover(self, recoveryTime):
+        if self.process is not None:
+            self.call("recover", recoveryTime)
+            return
+        self.start()
+        checkpointTime = self.call("loadCheckpoint", checkpointPath(self.logDirectory, self.dataManagerId))
+        self.call("replayLog", checkpointTime)
+        self.call("restart", self.failedTimes, recoveryTime)
+        for sequence in self.waiters:
+            if sequence in self.operations:
+                self.waitQueue.wake(self.operations[sequence])
+        self.waiters = set()
+
+    def close(self):
+        if self.process is not None:
+            self.connection.send(None)
+            self.process.join()
+            self.process = None
+
+class RemoteGarbageCollector:
+    """
+    Takes the place of the VersionGarbageCollector when the sites run in their own
+    processes, every site collects its own versions, in parallel, with a budget
+    of recordsPerTick records per site.
+    """
+
+    def __init__(self, dataManagers):
+        self.dataManagers = dataManagers
+
+    def collect(self, watermark):
+        fanOut(list(self.dataManagers.values()), "collectGarbage", watermark)
+
+    def getStats(self):
+        stats = {}
+        for siteStats in fanOut(list(self.dataManagers.values()), "gcStats"):
+            for name, value in (siteStats or {}).items():
+                stats[name] = stats.get(name, 0) + value
+        return stats
@@ -0,0 +1,85 @@
+from collections import OrderedDict, deque
+
+class Resynchronizer:
+    """
+    Brings the replicated records of a recovered site up to date in the background.
+    A recovered site can not serve reads of its replicated records until a write is
+    committed to them, instead every stale record copies the versions it missed from
+    a live replica that is up to date and becomes readable right away.
+    Only a replica that has not failed since the stale copy's latest version is
+    copied from, one that failed too may lack versions that snapshots still read.
+    A replica with a pending write on the record is not copied from, as that write
+    would never reach the recovered site, the record is retried in a later tick.
+    At most recordsPerTick records are brought up to date in one tick.
+    """
+
+    def __init__(self, dataManagers, placement, recordsPerTick=16):
+        """
+        pending maps the id of a recovered site to a deque of its
+        (record, latest commit time) that are still stale.
+        """
+        self.dataManagers = dataManagers
+        self.placement = placement
+        self.recordsPerTick = recordsPerTick
+        self.pending = OrderedDict()
+        self.recordsResynced = 0
+        self.versionsCopied = 0
+        self.retries = 0
+
+    def siteRecovered(self, siteId):
+        stale = self.dataManagers[siteId].staleRecords()
+        if stale:
+            self.pending[siteId] = deque(stale)
+
+    def siteFailed(self, siteId):
+        self.pending.pop(siteId, None)
+
+    def tick(self):
+        """
+        catches up to recordsPerTick stale records, the sites in the order they recovered.
+        """
+        budget = self.recordsPerTick
+        for siteId in list(self.pending.keys()):
+            if budget <= 0:
+                break
+            stale = self.pending[siteId]
+            for _ in range(min(budget, len(stale))):
+                budget -= 1
+                record, sinceTime = stale.popleft()
+                if not self.resyncRecord(siteId, record, sinceTime):
+                    stale.append((record, sinceTime))
+            if not stale:
+                del self.pending[siteId]
+
+    def resyncRecord(self, siteId, record, sinceTime):
+        """
+        copies the versions of record committed after sinceTime from an up to date
+        replica. Returns False if the record has to be retried later.
+        A record that no live replica has up to date is dropped, only a committed
+        write can make it readable again and that write reaches this site too.
+        """
+        busy = False
+        for peerId in self.placement.liveSitesFor(record):
+            if peerId == siteId:
+                continue
+            versions = self.dataManagers[peerId].committedVersionsSince(record, sinceTime)
+            if versions is False:
+                busy = True
+            elif versions is not None:
+                self.versionsCopied += self.dataManagers[siteId].catchUp(record, versions)
+                self.recordsResynced += 1
+                return True
+        if busy:
+            self.retries += 1
+        return not busy
+
+    def getStats(self):
+        """
+        returns the resync counters.
+        """
+        return {
+            "recordsResynced": self.recordsResynced,
+            "versionsCopied": self.versionsCopied,
+            "retries": self.retries,
+            "stillStale": sum(len(stale) for stale in self.pending.values()),
+        }
@@ -0,0 +1,220 @@
+import argparse
+import asyncio
+from commandparser import parseLine, ParseError
+from errors import InputError, SiteStateError
+from operations import *
+from transactionManager import TransactionManager, VICTIM_POLICIES
+from output import TextSink
+import output as events
+
+# python3 server.py --port 7000
+# serves the input language to many clients at once, one command per line.
+# Every command is answered with its output followed by a status line:
+#   OK           - the command completed.
+#   WAITING      - the operation has to wait, DONE <operation> follows once it completes,
+#                  or ABORTED <operation> <reason> if its transaction is aborted first.
+#   ERROR <why>  - the command was rejected and nothing was executed.
+
+class Client:
+    """
+    A single connection.
+    transactions are the ids of the transactions it has begun.
+    waiting maps its operations that have not completed yet to their transaction.
+    output collects what has to be sent to it, it is written out once per batch.
+    """
+
+    def __init__(self, clientId, writer):
+        self.clientId = clientId
+        self.writer = writer
+        self.transactions = set()
+        self.waiting = {}
+        self.output = []
+
+class Router(TextSink):
+    """
+    Output of the TransactionManager that writes every event about a transaction
+    to the client that owns it, like the output of a retried operation or the
+    abort of a deadlock victim, whichever client's command caused it.
+    The other events go to client, the client whose command is being executed,
+    except Deadlock Detected which goes along with the abort of the victim after it.
+    """
+
+    def __init__(self, owners):
+        super().__init__(bufferSize=0)
+        self.owners = owners
+        self.client = None
+        self.held = []
+
+    def emit(self, event, *args):
+        if event.level > self.level:
+            return
+        if event is events.DEADLOCK_DETECTED:
+            self.held.append((event, args))
+            return
+        client = self.owners.get(self.transactionOf(event, args), self.client)
+        if client is None:
+            return
+        for heldEvent, heldArgs in self.held:
+            client.output.append(self.format(heldEvent, heldArgs) + "\n")
+        self.held = []
+        client.output.append(self.format(event, args) + "\n")
+
+    def transactionOf(self, event, args):
+        """
+        the id of the transaction event is about, or None.
+        """
+        if "transaction" in event.fields:
+            return args[event.fields.index("transaction")]
+        if "operation" in event.fields:
+            return getattr(args[event.fields.index("operation")], "transactionId", None)
+        return None
+
+class Server:
+    """
+    Accepts connections and executes their commands on a single TransactionManager.
+    The commands of all connections go through one queue, every command is still
+    one tick, but whatever is queued is executed in one go and every client gets
+    the output of the whole batch with one write.
+    Commands that would make the TransactionManager stop with an input error are
+    rejected up front, so one client can not take the server down.
+    """
+
+    def __init__(self, numOfSites, numOfRecords, victimPolicy="youngest", batchSize=256):
+        """
+        owners maps the id of every transaction to the Client that began it.
+        """
+        self.owners = {}
+        self.router = Router(self.owners)
+        self.transManager = TransactionManager(numOfSites, numOfRecords, None, victimPolicy, output=self.router)
+        self.batchSize = batchSize
+        self.commands = asyncio.Queue()
+        self.clients = {}
+        self.nextClientId = 0
+
+    async def handleConnection(self, reader, writer):
+        self.nextClientId += 1
+        client = Client(self.nextClientId, writer)
+        self.clients[client.clientId] = client
+        try:
+            async for line in reader:
+                line = line.decode().strip()
+                if line.lower() == "quit":
+                    break
+                await self.commands.put((client, line))
+        finally:
+            await self.commands.put((client, None))
+
+    async def executeCommands(self):
+        """
+        executes the queued commands in batches and writes out the output.
+        """
+        while True:
+            batch = [await self.commands.get()]
+            while len(batch) < self.batchSize and not self.commands.empty():
+                batch.append(self.commands.get_nowait())
+
+            for client, line in batch:
+                self.router.client = client
+                if line is None:
+                    self.disconnect(client)
+                else:
+                    client.output.append(self.execute(client, line) + "\n")
+            self.router.client = None
+            self.announceCompleted()
+
+            written = []
+            for client in self.clients.values():
+                if client.output and not client.writer.is_closing():
+                    client.writer.write("".join(client.output).encode())
+                    written.append(client.writer.drain())
+                client.output = []
+            await asyncio.gather(*written, return_exceptions=True)
+
+    def execute(self, client, line):
+        """
+        executes a single command of client and returns its status line.
+        """
+        try:
+            operation = parseLine(line, None, self.transManager.numOfRecords, self.transManager.numOfSites)
+        except ParseError:
+            return "ERROR the given input doesnt match the input requirements"
+        if operation is None:
+            return "OK"
+        try:
+            self.validate(client, operation)
+            self.transManager.check(operation)
+            self.transManager.execute(operation, checked=True)
+        except InputError as error:
+            return "ERROR {}".format(error)
+
+        if isinstance(operation, BeginOp) or isinstance(operation, BeginROOp):
+            self.owners[operation.transactionId] = client
+            client.transactions.add(operation.transactionId)
+        if getattr(operation, "status", OperationStatus.COMPLETED) == OperationStatus.IN_PROGRESS:
+            client.waiting[operation] = self.transManager.liveTransactions[operation.transactionId]
+            return "WAITING"
+        return "OK"
+
+    def validate(self, client, operation):
+        """
+        raises an InputError for what the server does not allow on top of
+        TransactionManager.check - using a transaction of another connection,
+        failing a failed site and recovering a live one.
+        """
+        if isinstance(operation, ReadOp) or isinstance(operation, WriteOp) or isinstance(operation, EndOp) or \
+            isinstance(operation, MultiReadOp) or isinstance(operation, MultiWriteOp):
+            if operation.transactionId not in client.transactions and self.transManager.isKnownTransaction(operation.transactionId):
+                raise InputError("transaction {} was not begun on this connection".format(operation.transactionId))
+        elif isinstance(operation, FailOp) or isinstance(operation, RecoverOp):
+            failed = operation.site in self.transManager.placement.failedSites
+            if self.transManager.placement.isValidSite(operation.site) and failed == isinstance(operation, FailOp):
+                raise SiteStateError(operation.site, "failed" if failed else "live")
+
+    def announceCompleted(self):
+        """
+        tells the clients about their waiting operations that have completed,
+        either by being retried or by their transaction being aborted.
+        """
+        for client in self.clients.values():
+            completed = [operation for operation in client.waiting if operation.status == OperationStatus.COMPLETED]
+            for operation in completed:
+                transaction = client.waiting.pop(operation)
+                if getattr(operation, "result", None) is None and transaction.abortReason is not None:
+                    client.output.append("ABORTED {} {}\n".format(operation, transaction.abortReason))
+                else:
+                    client.output.append("DONE {}\n".format(operation))
+
+    def disconnect(self, client):
+        """
+        aborts the live transactions of a client that has gone away or quit,
+        and sends it whatever output it still has before closing the connection.
+        """
+        for transactionId in client.transactions:
+            if transactionId in self.transManager.liveTransactions:
+                self.transManager.abortTransaction(transactionId, "disconnected")
+            del self.owners[transactionId]
+        self.transManager.refreshOperations()
+        del self.clients[client.clientId]
+        if client.output and not client.writer.is_closing():
+            client.writer.write("".join(client.output).encode())
+        client.writer.close()
+
+    async def serve(self, host="127.0.0.1", port=7000, path=None):
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handleConnection, path)
+        else:
+            server = await asyncio.start_server(self.handleConnection, host, port)
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.executeCommands())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RepCRec network server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7000)
+    parser.add_argument("--unix", dest="path", default=None, help="Listen on this unix socket instead of tcp.")
+    parser.add_argument("--sites", dest="numOfSites", type=int, default=10, help="Number of sites.")
+    parser.add_argument("--records", dest="numOfRecords", type=int, default=20, help="Number of records.")
+    parser.add_argument("--victim-policy", dest="victimPolicy", default="youngest", choices=sorted(VICTIM_POLICIES))
+    arguments = parser.parse_args()
+    server = Server(arguments.numOfSites, arguments.numOfRecords, arguments.victimPolicy)
+    asyncio.run(server.serve(arguments.host, arguments.port, arguments.path))
@@ -0,0 +1,184 @@
+import cProfile
+import io
+import pstats
+import time
+from collections import Counter
+from operations import OperationStatus
+
+class Phase:
+    """
+    Times one phase of a tick, used as a context manager, add is called with
+    the name and the seconds it took.
+    """
+    __slots__ = ("add", "name", "started")
+
+    def __init__(self, add, name):
+        self.add = add
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exception):
+        self.add(self.name, time.perf_counter() - self.started)
+
+class NoPhase:
+    """
+    Phase that does nothing, handed out when the stats are turned off.
+    """
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exception):
+        pass
+
+NO_PHASE = NoPhase()
+
+def bucket(value):
+    """
+    the power of two histogram bucket of a non negative value, 0, 1, 2, 4, 8 ...
+    """
+    return 0 if value <= 0 else 1 << (int(value).bit_length() - 1)
+
+class Stats:
+    """
+    Instrumentation of the TransactionManager.
+    When it is turned off every hook returns right away and phase hands out
+    NO_PHASE, so the hot path only pays for a method call.
+    Waits are measured in ticks, from the tick an operation first had to wait
+    to the tick it completed.
+    """
+
+    def __init__(self, enabled=False, profileTicks=None):
+        """
+        phaseTimes and phaseCounts - total seconds and number of runs of every phase.
+        parseTime and parseCount - total seconds and number of lines parsed, the parsing
+        runs on the reader thread at the same time as the phases, so it is kept apart.
+        waitHistograms - record id to a Counter of the wait buckets of the operations on it.
+        waitingSince - blocked operation to the tick it first had to wait.
+        retries - operation that has not finished yet to the number of times it has been retried.
+        retryHistogram - number of retries to the number of finished operations retried that often.
+        An operation is finished once it completes or its transaction is retired, then
+        it is dropped from waitingSince and retries, so they only hold live operations.
+        deadlockRuns and deadlocksFound - the cost of the deadlock detection is in phaseTimes.
+        preventionAborts - transactions aborted by the deadlock prevention.
+        profileTicks - (first, last) ticks to capture with cProfile, or None.
+        """
+        self.enabled = enabled
+        self.phaseTimes = Counter()
+        self.phaseCounts = Counter()
+        self.parseTime = 0.0
+        self.parseCount = 0
+        self.waitHistograms = {}
+        self.waitingSince = {}
+        self.retries = Counter()
+        self.retryHistogram = Counter()
+        self.deadlockRuns = 0
+        self.deadlocksFound = 0
+        self.preventionAborts = 0
+        self.profileTicks = profileTicks
+        self.profiler = None
+
+    def phase(self, name):
+        if not self.enabled:
+            return NO_PHASE
+        return Phase(self.addPhaseTime, name)
+
+    def parsing(self):
+        if not self.enabled:
+            return NO_PHASE
+        return Phase(self.addParseTime, "parse")
+
+    def addPhaseTime(self, name, seconds):
+        self.phaseTimes[name] += seconds
+        self.phaseCounts[name] += 1
+
+    def addParseTime(self, name, seconds):
+        self.parseTime += seconds
+        self.parseCount += 1
+
+    def startTick(self, tick):
+        if self.profileTicks is not None and tick == self.profileTicks[0]:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def endTick(self, tick):
+        if self.profiler is not None and tick == self.profileTicks[1]:
+            self.profiler.disable()
+
+    def deadlockDetection(self, deadlocksFound):
+        if not self.enabled:
+            return
+        self.deadlockRuns += 1
+        self.deadlocksFound += deadlocksFound
+
+    def deadlockPrevented(self, aborted):
+        if not self.enabled:
+            return
+        self.preventionAborts += aborted
+
+    def operationBlocked(self, operation, tick):
+        if not self.enabled:
+            return
+        self.waitingSince.setdefault(operation, tick)
+
+    def operationRetried(self, operation, tick):
+        """
+        counts a retry of a blocked operation and records its wait once it completes.
+        """
+        if not self.enabled:
+            return
+        self.retries[operation] += 1
+        if operation.status == OperationStatus.COMPLETED:
+            if operation in self.waitingSince:
+                waited = tick - self.waitingSince.pop(operation)
+                for record in operation.records if hasattr(operation, "records") else (operation.record,):
+                    self.waitHistograms.setdefault(record, Counter())[bucket(waited)] += 1
+            self.operationFinished(operation)
+
+    def transactionRetired(self, transaction):
+        """
+        drops the operations of a retired transaction, like the ones cut short by an abort.
+        """
+        if not self.enabled:
+            return
+        for operation in transaction.operations:
+            self.waitingSince.pop(operation, None)
+            self.operationFinished(operation)
+
+    def operationFinished(self, operation):
+        if operation in self.retries:
+            self.retryHistogram[self.retries.pop(operation)] += 1
+
+    def snapshot(self, dataManagers=None):
+        """
+        returns all the counters as a dict.
+        The version chain lengths of dataManagers are computed here, so they
+        cost nothing while running.
+        """
+        result = {
+            "phases": {name: {"seconds": self.phaseTimes[name], "count": self.phaseCounts[name]} for name in sorted(self.phaseTimes)},
+            "parsing": {"seconds": self.parseTime, "count": self.parseCount},
+            "deadlockDetection": {
+                "runs": self.deadlockRuns,
+                "deadlocksFound": self.deadlocksFound,
+                "seconds": self.phaseTimes["deadlock"],
+                "preventionAborts": self.preventionAborts,
+            },
+            "lockWaitTicks": {"x{}".format(record): dict(sorted(histogram.items())) \
+                for record, histogram in sorted(self.waitHistograms.items())},
+            "stillWaiting": sum(1 for operation in self.waitingSince if operation.status == OperationStatus.IN_PROGRESS),
+            "retriesPerOperation": dict(sorted((self.retryHistogram + Counter(self.retries.values())).items())),
+        }
+        if dataManagers is not None:
+            chainLengths = Counter()
+            for dm in dataManagers.values():
+                for length in dm.versionChainLengths():
+                    chainLengths[bucket(length)] += 1
+            result["versionChainLengths"] = dict(sorted(chainLengths.items()))
+        if self.profiler is not None:
+            output = io.StringIO()
+            pstats.Stats(self.profiler, stream=output).sort_stats("cumulative").print_stats(20)
+            result["profile"] = output.getvalue()
+        return result
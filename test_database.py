@@ -0,0 +1,144 @@
+import unittest
+from database import Database
+from errors import InputError, PendingOperationsError, ReadOnlyWriteError, RecordOutOfRangeError, SiteStateError, \
+    TransactionAborted, TransactionExistsError, UnknownTransactionError
+
+# python -m unittest test_database
+
+class FutureTest(unittest.TestCase):
+    """
+    Reads and writes that have to wait complete their futures in a later tick,
+    or fail them if their transaction gets aborted first.
+    """
+
+    def testBlockedReadCompletesOnCommit(self):
+        database = Database()
+        writer = database.begin()
+        writer.write("x2", 5)
+        reader = database.begin()
+        future = reader.read("x2")
+        self.assertFalse(future.done())
+        self.assertTrue(reader.waiting)
+        writer.commit()
+        self.assertEqual(future.result(), 5)
+        self.assertFalse(reader.waiting)
+        reader.commit()
+
+    def testDeadlockVictimIsAborted(self):
+        database = Database()
+        first, second = database.begin(), database.begin()
+        first.write("x1", 1)
+        second.write("x2", 2)
+        firstWaits = first.write("x2", 1)
+        secondWaits = second.write("x1", 2)
+        database.dump()
+        with self.assertRaises(TransactionAborted) as aborted:
+            secondWaits.result()
+        self.assertEqual((aborted.exception.transactionId, aborted.exception.reason), (second.transactionId, "deadlock"))
+        self.assertTrue(firstWaits.done())
+        with self.assertRaises(TransactionAborted):
+            second.commit()
+        first.commit()
+
+    def testWoundedTransactionIsAborted(self):
+        database = Database(deadlockPrevention="wound-wait")
+        older, younger = database.begin(), database.begin()
+        older.write("x4", 1)
+        younger.write("x2", 2)
+        youngerWaits = younger.write("x4", 2)
+        self.assertFalse(youngerWaits.done())
+        older.write("x2", 1)
+        with self.assertRaises(TransactionAborted) as aborted:
+            youngerWaits.result()
+        self.assertEqual(aborted.exception.reason, "deadlockPrevention")
+        self.assertEqual(younger.abortReason, "deadlockPrevention")
+        older.commit()
+        self.assertEqual(database.dump()[1][2], 1)
+
+    def testAbortOnRequest(self):
+        database = Database()
+        writer = database.begin()
+        writer.write("x2", 5)
+        reader = database.begin()
+        future = reader.read("x2")
+        reader.abort("timeout")
+        with self.assertRaises(TransactionAborted) as aborted:
+            future.result()
+        self.assertEqual(aborted.exception.reason, "timeout")
+        writer.commit()
+
+
+class InputErrorTest(unittest.TestCase):
+    """
+    An operation that can not be executed raises its typed InputError and no tick runs.
+    """
+
+    def setUp(self):
+        self.database = Database()
+
+    def assertRejected(self, error, call, *args):
+        time = self.database.time
+        with self.assertRaises(error) as raised:
+            call(*args)
+        self.assertIsInstance(raised.exception, InputError)
+        self.assertEqual(self.database.time, time)
+
+    def testTransactionExists(self):
+        self.database.begin("T1")
+        self.assertRejected(TransactionExistsError, self.database.begin, "T1")
+
+    def testEndedTransaction(self):
+        transaction = self.database.begin()
+        transaction.commit()
+        self.assertRejected(UnknownTransactionError, transaction.read, "x2")
+        self.assertRejected(UnknownTransactionError, transaction.abort)
+
+    def testRecordOutOfRange(self):
+        transaction = self.database.begin()
+        self.assertRejected(RecordOutOfRangeError, transaction.read, "x21")
+        self.assertRejected(RecordOutOfRangeError, transaction.write, 0, 1)
+
+    def testSiteState(self):
+        self.database.fail(3)
+        self.assertRejected(SiteStateError, self.database.fail, 3)
+        self.assertRejected(SiteStateError, self.database.recover, 4)
+
+    def testWriteOnReadOnly(self):
+        transaction = self.database.begin(readOnly=True)
+        self.assertRejected(ReadOnlyWriteError, transaction.write, "x2", 1)
+
+    def testCommitWithPendingOperations(self):
+        writer = self.database.begin()
+        writer.write("x2", 5)
+        reader = self.database.begin()
+        reader.read("x2")
+        self.assertRejected(PendingOperationsError, reader.commit)
+
+class AsOfReadTest(unittest.TestCase):
+    """
+    The gc collects the versions that only reads as of an old time need,
+    unless that time is pinned.
+    """
+
+    def commitValues(self, database, values):
+        for value in values:
+            transaction = database.begin()
+            transaction.write("x2", value)
+            transaction.commit()
+
+    def testPinnedTimeCanBeRead(self):
+        for pinned in (False, True):
+            database = Database()
+            transManager = database.transManager
+            self.commitValues(database, [1])
+            auditTime = transManager.time
+            if pinned:
+                transManager.pinAsOf(auditTime)
+            self.commitValues(database, range(100, 130))
+            self.assertEqual(transManager.readAsOf(2, auditTime), [1, 1] if pinned else None)
+            self.assertEqual(transManager.readAsOf(2, transManager.time), [1, 129])
+        transManager.unpinAsOf(auditTime)
+        self.assertEqual(transManager.lowWatermark(), transManager.time)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import shutil
+import tempfile
+import unittest
+from database import Database
+
+# python -m unittest test_restart
+
+class RestartTest(unittest.TestCase):
+    """
+    A database restarted from its log directory has to come back with the
+    failed sites and the stale replicas it had before the restart.
+    """
+
+    def setUp(self):
+        self.logDirectory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.logDirectory)
+
+    def open(self, **options):
+        return Database(logDirectory=self.logDirectory, **options)
+
+    def commitWhileSiteFailed(self, database):
+        database.fail(1)
+        transaction = database.begin()
+        transaction.write("x2", 222)
+        transaction.commit()
+
+    def readAfterRestart(self, **options):
+        database = self.open(**options)
+        transaction = database.begin()
+        value = transaction.read("x2").result()
+        transaction.commit()
+        return database, value
+
+    def testFailedSiteStaysFailed(self):
+        self.commitWhileSiteFailed(self.open())
+        database, value = self.readAfterRestart()
+        self.assertEqual(value, 222)
+        self.assertIn(1, database.transManager.placement.failedSites)
+
+    def testRecoveredReplicaStaysStale(self):
+        database = self.open()
+        self.commitWhileSiteFailed(database)
+        database.recover(1)
+        database, value = self.readAfterRestart()
+        self.assertEqual(value, 222)
+        self.assertNotIn(1, database.transManager.placement.failedSites)
+        self.assertFalse(database.transManager.dataManagers[1].records[2].recovered)
+
+    def testCheckpointKeepsStaleReplica(self):
+        database = self.open(checkpointInterval=1)
+        self.commitWhileSiteFailed(database)
+        database.recover(1)
+        for _ in range(10):
+            database.dump()
+        database, value = self.readAfterRestart(checkpointInterval=1)
+        self.assertEqual(value, 222)
+        self.assertFalse(database.transManager.dataManagers[1].records[2].recovered)
+
+    def testCheckpointKeepsFailedSite(self):
+        database = self.open(checkpointInterval=1)
+        self.commitWhileSiteFailed(database)
+        for _ in range(10):
+            database.dump()
+        database, value = self.readAfterRestart(checkpointInterval=1)
+        self.assertEqual(value, 222)
+        self.assertIn(1, database.transManager.placement.failedSites)
+
+    def testLoggedValuesKeepTheirTypes(self):
+        database = self.open()
+        transaction = database.begin()
+        transaction.write("x2", "a\tb\nc")
+        transaction.write("x4", 44)
+        transaction.write("x6", "66")
+        transaction.commit()
+        database = self.open()
+        values = database.dump()[1]
+        self.assertEqual((values[2], values[4], values[6]), ("a\tb\nc", 44, "66"))
+
+    def testCheckpointedValuesKeepTheirTypes(self):
+        database = self.open(checkpointInterval=1)
+        transaction = database.begin()
+        transaction.write("x2", "a\0b")
+        transaction.write("x4", 44)
+        transaction.commit()
+        for _ in range(10):
+            database.dump()
+        database = self.open(checkpointInterval=1)
+        values = database.dump()[1]
+        self.assertEqual((values[2], values[4]), ("a\0b", 44))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+from database import Database
+
+# python -m unittest test_resync
+
+class ResyncTest(unittest.TestCase):
+    """
+    A recovered site may only copy the versions it missed from a replica that
+    has them all, otherwise snapshot reads from it return missing versions.
+    """
+
+    def commit(self, database, record, value):
+        transaction = database.begin()
+        transaction.write(record, value)
+        transaction.commit()
+
+    def testPeerThatFailedTooIsNotCopied(self):
+        database = Database(resyncRecordsPerTick=1)
+        database.fail(1)
+        self.commit(database, "x4", 100)
+        database.fail(2)
+        self.commit(database, "x4", 200)
+        snapshot = database.begin(readOnly=True)
+        writer = database.begin()
+        database.recover(2)
+        writer.write("x4", 400)
+        writer.commit()
+        database.recover(1)
+        while database.transManager.resync.pending:
+            database.dump()
+        site1 = database.transManager.dataManagers[1]
+        self.assertTrue(site1.records[4].recovered)
+        self.assertEqual(site1.readRecordAsOf(4, snapshot.transaction.startTime), [True, 200])
+        self.assertEqual(snapshot.read("x4").result(), 200)
+
+if __name__ == "__main__":
+    unittest.main()
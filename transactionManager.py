@@ -1,9 +1,63 @@
-from collections import OrderedDict, defaultdict
+from collections import Counter, OrderedDict, deque
 from datamanager import DataManager
 from operations import *
-import re
+from commandparser import OperationReader, ParseError, QUIT
+import os
 import sys
 from transactions import *
+from errors import InputError, TransactionExistsError, UnknownTransactionError, SiteOutOfRangeError, ReadOnlyWriteError, \
+    PendingOperationsError
+from waitforgraph import WaitForGraph, PREVENTION_POLICIES
+from waitqueue import WaitQueue
+from versiongc import VersionGarbageCollector
+from placement import PlacementDirectory
+from wal import WriteAheadLog
+from checkpoint import Checkpointer, checkpointPath
+from stats import Stats
+from resync import Resynchronizer
+from readrouting import READ_POLICIES
+from remotesite import RemoteDataManager, RemoteGarbageCollector, fanOut
+from output import TextSink
+import output as events
+
+def youngestVictim(transaction):
+    """
+    the youngest transaction is aborted first.
+    """
+    return transaction.startTime
+
+def fewestOperationsVictim(transaction):
+    """
+    the transaction which has completed the fewest operations is aborted first,
+    ties go to the youngest transaction.
+    """
+    completed = sum(1 for operation in transaction.operations if operation.status == OperationStatus.COMPLETED)
+    return (-completed, transaction.startTime)
+
+def leastWorkVictim(transaction):
+    """
+    the transaction with the fewest uncommitted writes is aborted first,
+    ties go to the youngest transaction.
+    """
+    writes = sum(len(operation.records) if isinstance(operation, MultiWriteOp) else 1 for operation in transaction.operations \
+        if (isinstance(operation, WriteOp) or isinstance(operation, MultiWriteOp)) and operation.status == OperationStatus.COMPLETED)
+    return (-writes, transaction.startTime)
+
+# Maps a victim policy name to a key function, the transaction with the largest key is aborted.
+VICTIM_POLICIES = {
+    "youngest": youngestVictim,
+    "fewest-operations": fewestOperationsVictim,
+    "least-work": leastWorkVictim,
+}
+
+# Names of the phases that the reads, writes and ends are timed under.
+PHASES = {
+    ReadOp: "read",
+    WriteOp: "write",
+    MultiReadOp: "read",
+    MultiWriteOp: "write",
+    EndOp: "end",
+}
 
 class TransactionManager:
     """
@@ -13,121 +67,142 @@ class TransactionManager:
     instantiating the dataManagers, failing/recovering a site.
     """
 
-    def __init__(self, numOfSites, numOfRecords, fileName):
+    def __init__(self, numOfSites, numOfRecords, fileName, victimPolicy="youngest", gcRecordsPerTick=16, logDirectory=None, groupCommit=True, checkpointInterval=None, stats=False, profileTicks=None, \
+        siteProcesses=False, killOnFail=False, readPolicy="first", output=None, deadlockPrevention=None, \
+        resyncRecordsPerTick=0, isolation="2pl", historySize=1000, deferredWrites=False):
         """
         if fileName is given the input will be read from a file,
         otherwise the input will be read from stdin.
-        allTransaction will store all live and completed transactions.
-        operations will store all the operations in the order they were received.
+        victimPolicy is one of VICTIM_POLICIES and decides which transaction
+        of a deadlock gets aborted.
+        placement decides which sites every record lives on, it is computed once
+        and shared by all the dataManagers.
+        waitForGraph is kept up to date by the records as locks are queued and released.
+        waitQueue collects the blocked operations that the records have woken up.
+        liveSnapshotTransactions maps the live transactions that read as of their
+        startTime, read only and snapshot isolation ones, to their startTime,
+        the oldest one is the low watermark of the versionGC, which collects up to
+        gcRecordsPerTick records at the end of every tick.
+        if logDirectory is given every site keeps a write-ahead log of its committed
+        versions in it and replays the log on startup, the clock resumes after the
+        latest replayed commit. With groupCommit the logs are synced once per tick,
+        otherwise once per committed version. Either way the output of a tick is
+        only written out at its end, after the sync, so a commit is never announced
+        before it is durable, unless the output writes every event right away.
+        With a checkpointInterval the sites are also checkpointed into logDirectory
+        every checkpointInterval ticks, a restart then loads the checkpoints and
+        only replays the tail of the logs.
+        stats turns on the instrumentation, see getStats, and profileTicks is an
+        optional (first, last) range of ticks to capture with cProfile.
+        With siteProcesses every site runs in its own process and the calls to the
+        replicas are fanned out in parallel, with killOnFail failing a site kills
+        its process and recovering it restarts it from its checkpoint and log.
+        readPolicy is one of READ_POLICIES and decides which replica serves a read.
+        output is the sink every event is emitted to, by default the buffered text
+        output on stdout, it is flushed at the end of run.
+        deadlockPrevention is None to detect deadlocks once per tick, or one of
+        PREVENTION_POLICIES to decide every conflicting lock request by the start
+        times of the transactions, so deadlocks can not form.
+        With resyncRecordsPerTick a recovered site copies the versions it missed from
+        an up to date replica, up to resyncRecordsPerTick records at the end of every
+        tick, instead of waiting for a write to make its replicated records readable.
+        isolation is one of ISOLATION_LEVELS, with "2pl" read write transactions lock
+        what they read, with "snapshot" they read as of their startTime without locks.
+        With deferredWrites read write transactions keep their writes to themselves
+        and only apply them to the sites when they commit, an abort just drops them.
+        liveTransactions are the transactions that have not ended yet, once one ends
+        it is retired: its id goes into endedTransactions, so the name can not be
+        reused, and the transaction itself into history. Both keep only the last
+        historySize ended transactions, so memory stays flat however long the input
+        is, the name of an older ended transaction can be reused.
+        operations maps the sequence of every operation of a live transaction to it,
+        nextSequence is the sequence of the next operation received.
+        siteIndex maps every site to the live transactions that have touched it.
         """
         self.numOfSites = numOfSites
         self.numOfRecords = numOfRecords
-        
+        if numOfSites < 1 or numOfRecords < 1:
+            raise Exception("InputError: There must be at least one site and one record")
+        if victimPolicy not in VICTIM_POLICIES:
+            raise Exception("InputError: Unknown victim policy {}".format(victimPolicy))
+        self.victimPolicy = VICTIM_POLICIES[victimPolicy]
+        if readPolicy not in READ_POLICIES:
+            raise Exception("InputError: Unknown read policy {}".format(readPolicy))
+        if isolation not in ISOLATION_LEVELS:
+            raise Exception("InputError: Unknown isolation level {}".format(isolation))
+        self.readWriteTransaction = ISOLATION_LEVELS[isolation]
+        self.deferredWrites = deferredWrites
+        if deadlockPrevention is not None and deadlockPrevention not in PREVENTION_POLICIES:
+            raise Exception("InputError: Unknown deadlock prevention {}".format(deadlockPrevention))
+
         if fileName != None:
-            self.inputFile = open(fileName)
+            self.inputFile = open(fileName, buffering=1 << 20)
         else:
             self.inputFile = sys.stdin
 
+        self.output = output if output is not None else TextSink()
         self.time = 0
-        self.allTransactions = OrderedDict()
+        self.liveTransactions = OrderedDict()
+        self.endedTransactions = OrderedDict()
+        self.history = deque(maxlen=historySize)
+        self.siteIndex = SiteIndex()
         self.dataManagers = OrderedDict()
-        self.operations = []
+        self.operations = {}
+        self.nextSequence = 0
+        self.waitForGraph = WaitForGraph(PREVENTION_POLICIES.get(deadlockPrevention))
+        self.waitQueue = WaitQueue()
+        self.placement = PlacementDirectory(self.numOfSites, self.numOfRecords)
+        if logDirectory != None:
+            os.makedirs(logDirectory, exist_ok=True)
         for i in range(1, self.numOfSites + 1):
-            self.dataManagers[i] = DataManager(i, self.numOfRecords)
-
-        
-    def parseInput(self, line):
-        """
-        parses the input throws an exception if there is a problem.
-        """
-        line = line.strip()
-
-        commentSplit = line.split("//")
-        if commentSplit[0].strip():
-            line = commentSplit[0].strip()
-        else:
-            return None
-        
-        
-        def parseArgs(inp):
-            inp = inp.strip("() ").split(",")
-            temp = []
-            for elem in inp:
-                if elem.strip() and elem.strip().isalnum():
-                    temp.append(elem.strip())
-            return temp
-        
-
-        try:
-            if not re.match("^(begin|beginRO|R|W|dump|end|fail|recover)[(]([A-Z]|[a-z]|[0-9]|,| )*[)]$", line):
-                raise Exception()    
-            
-            if re.match("^begin[(]([A-Z]|[a-z]|[0-9]|,| )*[)]$", line):
-                args = parseArgs(line[5:])
-                if len(args) == 1:
-                    return BeginOp(args[0])
-                else:
-                    raise Exception()
-            elif re.match("^beginRO[(]([A-Z]|[a-z]|[0-9]|,| )*[)]$", line):
-                args = parseArgs(line[7:])
-                if len(args) == 1:
-                    return BeginROOp(args[0])
-                else:
-                    raise Exception()
-            elif re.match("^R[(]([A-Z]|[a-z]|[0-9]|,| )*[)]$", line):
-                args = parseArgs(line[1:])
-                if len(args) == 2 and re.match("^x([1-9]|1[0-9]|20)$", args[1]):
-                    return ReadOp(args[0], args[1])
-                else:
-                    raise Exception()
-            elif re.match("^W[(]([A-Z]|[a-z]|[0-9]|,| )*[)]$", line):
-                args = parseArgs(line[1:])
-                if len(args) == 3 and re.match("^x([1-9]|1[0-9]|20)$", args[1]):
-                    return WriteOp(args[0], args[1], args[2])
-                else:
-                    raise Exception()
-            elif re.match("^dump[(]([A-Z]|[a-z]|[0-9]|,| )*[)]$", line):
-                args = parseArgs(line[4:])
-                if len(args) == 0:
-                    return DumpOp()
-                else:
-                    raise Exception()
-            elif re.match("^end[(]([A-Z]|[a-z]|[0-9]|,| )*[)]$", line):
-                args = parseArgs(line[3:])
-                if len(args) == 1:
-                    return EndOp(args[0])
-                else:
-                    raise Exception()
-            elif re.match("^fail[(]([A-Z]|[a-z]|[0-9]|,| )*[)]$", line):
-                args = parseArgs(line[4:])
-                if len(args) == 1 and re.match("^([1-9]|10)$", args[0]):
-                    return FailOp(args[0])
-                else:
-                    raise Exception()
-            elif re.match("^recover[(]([A-Z]|[a-z]|[0-9]|,| )*[)]$", line):
-                args = parseArgs(line[7:])
-                if len(args) == 1 and re.match("^([1-9]|10)$", args[0]):
-                    return RecoverOp(args[0])
-                else:
-                    raise Exception()
+            if siteProcesses:
+                self.dataManagers[i] = RemoteDataManager(i, self.placement, self.operations, self.waitForGraph, self.waitQueue, \
+                    logDirectory, groupCommit, gcRecordsPerTick, killOnFail, deadlockPrevention)
             else:
-                raise Exception()
-            
-            
-        except:
-            print("InputError: The given input - {} doesnt match the input requirements.".format(line))
-            exit()
+                log = None
+                if logDirectory != None:
+                    log = WriteAheadLog(os.path.join(logDirectory, "site{}.log".format(i)), groupCommit)
+                self.dataManagers[i] = DataManager(i, self.placement, self.waitForGraph, self.waitQueue, log)
+            checkpointTime = 0
+            if logDirectory != None:
+                checkpointTime = self.dataManagers[i].loadCheckpoint(checkpointPath(logDirectory, i))
+            self.time = max(self.time, self.dataManagers[i].replayLog(checkpointTime))
+            if self.dataManagers[i].isFailed():
+                self.placement.markFailed(i)
+        self.readRouter = READ_POLICIES[readPolicy](self.dataManagers)
+        self.liveSnapshotTransactions = OrderedDict()
+        self.pinnedTimes = Counter()
+        if siteProcesses:
+            self.versionGC = RemoteGarbageCollector(self.dataManagers)
+        else:
+            self.versionGC = VersionGarbageCollector(self.dataManagers, gcRecordsPerTick)
+        self.stats = Stats(stats, profileTicks)
+        self.checkpointer = None
+        if checkpointInterval != None:
+            if logDirectory == None:
+                raise Exception("InputError: Checkpoints need a log directory")
+            self.checkpointer = Checkpointer(self.dataManagers, logDirectory, checkpointInterval)
+        self.resync = None
+        if resyncRecordsPerTick > 0:
+            self.resync = Resynchronizer(self.dataManagers, self.placement, resyncRecordsPerTick)
+            for i in self.dataManagers:
+                if i not in self.placement.failedSites:
+                    self.resync.siteRecovered(i)
 
+        
     def fail(self, dataManagerId):
         """
         fails a site/dataManager.
         """
-        print("Site-{} fails".format(dataManagerId))
+        self.output.emit(events.SITE_FAILS, dataManagerId)
         self.dataManagers[dataManagerId].fail(self.time)
-        for transaction in self.allTransactions.values():
+        self.placement.markFailed(dataManagerId)
+        if self.resync is not None:
+            self.resync.siteFailed(dataManagerId)
+        for transactionId in self.siteIndex.transactionsAt(dataManagerId):
+            transaction = self.liveTransactions[transactionId]
             if transaction.status == TransactionStatus.ALIVE and \
-                isinstance(transaction, ReadWriteTransaction) and \
-                dataManagerId in transaction.dataManagersTouched:
+                isinstance(transaction, ReadWriteTransaction):
                 transaction.status = TransactionStatus.ABORTED
                 # print("Transaction {} will abort because it had touched site {}".format(transaction.transactionId, dataManagerId))
 
@@ -136,66 +211,145 @@ class TransactionManager:
         """
         recovers a site/dataManager.
         """
-        print("Site-{} recovers".format(dataManagerId))
-        self.dataManagers[dataManagerId].recover()
+        self.output.emit(events.SITE_RECOVERS, dataManagerId)
+        self.dataManagers[dataManagerId].recover(self.time)
+        self.placement.markLive(dataManagerId)
+        if self.resync is not None:
+            self.resync.siteRecovered(dataManagerId)
 
 
-    def dump(self):
+    def readAsOf(self, record, asOfTime):
         """
-        dumps the values on all the sites/dataManagers.
+        reads a record as it was committed at asOfTime, the same way a read only
+        transaction that began at asOfTime would.
+        Returns [siteId, data] or None if no live site can serve the read.
+        Versions older than the low watermark are garbage collected, so with the gc
+        running a time before the oldest live read only transaction can only be read
+        if it has been pinned with pinAsOf before its versions were collected,
+        otherwise None is returned.
         """
-        for dataManager in self.dataManagers.values():
-            dataManager.dump()
+        for siteId in self.placement.liveSitesFor(record):
+            dataManager = self.dataManagers[siteId]
+            resultAndData = dataManager.readRecordAsOf(record, asOfTime)
+            if resultAndData[0]:
+                return [dataManager.dataManagerId, resultAndData[1]]
+        return None
 
-    def cycleDetected(self, node, visited, root, graph):
+    def pinAsOf(self, asOfTime):
         """
-        runs DFS to check if there is a cycle in the graph.
+        keeps the gc from collecting the versions that a read as of asOfTime needs,
+        until unpinAsOf is called with the same time. Pins are counted, and only
+        protect the versions that are still there when they are taken, so pin the
+        current time to be able to read as of it later.
         """
-        visited.add(node)
-        for neighbour in graph[node]:
-            if neighbour == root:
-                return True
-            if neighbour not in visited:
-                if self.cycleDetected(neighbour, visited, root, graph):
-                    return True
-        return False
+        self.pinnedTimes[asOfTime] += 1
 
-    def checkAndDealWithDeadlock(self):
+    def unpinAsOf(self, asOfTime):
+        self.pinnedTimes[asOfTime] -= 1
+        if self.pinnedTimes[asOfTime] <= 0:
+            del self.pinnedTimes[asOfTime]
+
+    def dump(self):
         """
-        checks if there is a deadlock and aborts the youngest transaction.
+        dumps the values on all the sites/dataManagers.
+        Returns them as a dict of site id to its list of (record, value), None for a killed site.
         """
-        blockingRelations = set()
+        dumped = {}
         for dataManager in self.dataManagers.values():
-            blockingRelations.update(dataManager.getBlockingRelations())
-        graph = defaultdict(set)
-        for node, neighbour in blockingRelations:
-            graph[node].add(neighbour)
-        youngestTransTS = float("-inf")
-        youngestTrans = None
-        for trans in list(graph.keys()):
-            if self.cycleDetected(trans, set(), trans, graph) and self.allTransactions[trans].startTime > youngestTransTS:
-                youngestTransTS = self.allTransactions[trans].startTime
-                youngestTrans = self.allTransactions[trans]
-        
-        if youngestTrans:
-            print("Deadlock Detected")
-            youngestTrans.abortDeadlockedTransaction()
-            return True
-        return False
+            values = dataManager.dump()
+            if values is None:
+                self.output.emit(events.SITE_KILLED, dataManager.dataManagerId)
+            else:
+                self.output.emit(events.DUMP, dataManager.dataManagerId, values)
+            dumped[dataManager.dataManagerId] = values
+        return dumped
+
+    def checkAndDealWithDeadlock(self):
+        """
+        checks if there are deadlocks and aborts one victim per deadlock,
+        chosen by the victim policy.
+        All the deadlocks are found by a single pass over the wait-for graph,
+        which is repeated until aborting the victims has broken every cycle.
+        """
+        deadlocksFound = 0
+        deadlocks = self.waitForGraph.findDeadlocks()
+        while deadlocks:
+            for deadlock in deadlocks:
+                victim = max((self.liveTransactions[trans] for trans in deadlock), key=self.victimPolicy)
+                self.output.emit(events.DEADLOCK_DETECTED)
+                victim.abortDeadlockedTransaction()
+            deadlocksFound += len(deadlocks)
+            deadlocks = self.waitForGraph.findDeadlocks()
+        self.stats.deadlockDetection(deadlocksFound)
+        return deadlocksFound > 0
 
 
 
     def refreshOperations(self):        
         """
         Some operations would have to wait when they initially come.
-        So we refresh the operations again after each tick to check if they
-        can execute.
+        So we refresh the operations that have been woken up by a change on a
+        record they are waiting for to check if they can execute.
         """
-        for operation in self.operations:
-            if isinstance(operation, (ReadOp, WriteOp, EndOp)) \
-                and operation.status == OperationStatus.IN_PROGRESS \
-                and self.allTransactions[operation.transactionId].status != TransactionStatus.COMPLETED:
-                self.allTransactions[operation.transactionId].processOperation(operation)
+        for operation in self.waitQueue.drain():
+            if operation.status == OperationStatus.IN_PROGRESS \
+                and operation.transactionId in self.liveTransactions \
+                and self.liveTransactions[operation.transactionId].status != TransactionStatus.COMPLETED:
+                self.retryOperation(operation)
+
+    def retryOperation(self, operation):
+        """
+        retries a single blocked operation.
+        """
+        self.liveTransactions[operation.transactionId].processOperation(operation)
+        self.abortWounded()
+        self.stats.operationRetried(operation, self.time)
+
+    def abortWounded(self):
+        """
+        aborts the transactions that the deadlock prevention has decided to abort.
+        """
+        aborted = 0
+        for transactionId in self.waitForGraph.drainWounded():
+            transaction = self.liveTransactions.get(transactionId)
+            if transaction is not None and transaction.status != TransactionStatus.COMPLETED and not transaction.isDeadlocked:
+                transaction.abortToPreventDeadlock()
+                aborted += 1
+        if aborted:
+            self.stats.deadlockPrevented(aborted)
+
+    def abortTransaction(self, transactionId, reason):
+        """
+        ends a live transaction right away for reason, outside of a tick.
+        A read write one drops its writes and locks.
+        """
+        transaction = self.liveTransactions[transactionId]
+        self.liveSnapshotTransactions.pop(transactionId, None)
+        if not isinstance(transaction, ReadOnlyTransaction):
+            transaction.abort(reason)
+        transaction.abortReason = reason
+        transaction.status = TransactionStatus.COMPLETED
+        self.retireTransaction(transactionId)
+
+    def isKnownTransaction(self, transactionId):
+        """
+        checks if a transaction of this name has been begun, whether it has ended or not.
+        """
+        return transactionId in self.liveTransactions or transactionId in self.endedTransactions
+
+    def retireTransaction(self, transactionId):
+        """
+        moves an ended transaction and its operations out of the live structures.
+        """
+        transaction = self.liveTransactions.pop(transactionId)
+        for operation in transaction.operations:
+            self.operations.pop(operation.sequence, None)
+        self.siteIndex.release(transactionId, transaction.dataManagersTouched)
+        self.endedTransactions[transactionId] = None
+        if len(self.endedTransactions) > self.history.maxlen:
+            self.endedTransactions.popitem(last=False)
+        self.history.append(transaction)
+        self.stats.transactionRetired(transaction)
 
 
     def run(self):
@@ -203,62 +357,138 @@ class TransactionManager:
         Calls the operations on the appropriate transaction.
         This is the main flow of the whole project.
         """
-        for line in self.inputFile:
-            if line.strip().lower() == "quit":
-                quit()
-            
-            operation = self.parseInput(line.strip())
-            if not operation:
-                continue
-
-            self.time += 1
-            print("---------- Time={} ----------".format(self.time))
-            #print(operation)
-            if self.checkAndDealWithDeadlock():
+        try:
+            for lineNumber, line, operation in OperationReader(self.inputFile, self.numOfRecords, self.numOfSites, self.stats):
+                if operation is QUIT:
+                    quit()
+                if isinstance(operation, ParseError):
+                    self.output.emit(events.PARSE_ERROR, operation)
+                    exit()
+
+                try:
+                    self.execute(operation)
+                except InputError as error:
+                    if error.lineError:
+                        self.output.emit(events.LINE_ERROR, lineNumber, line)
+                    self.output.emit(error.event, *error.args)
+                    exit()
+        finally:
+            self.output.flush()
+
+    def check(self, operation):
+        """
+        raises the InputError that executing operation would run into, without executing anything.
+        """
+        if isinstance(operation, BeginOp) or isinstance(operation, BeginROOp):
+            if self.isKnownTransaction(operation.transactionId):
+                raise TransactionExistsError(operation.transactionId)
+        elif isinstance(operation, ReadOp) or isinstance(operation, WriteOp) or isinstance(operation, EndOp) or \
+            isinstance(operation, MultiReadOp) or isinstance(operation, MultiWriteOp):
+            transaction = self.liveTransactions.get(operation.transactionId)
+            if transaction is None or transaction.status == TransactionStatus.COMPLETED:
+                raise UnknownTransactionError(operation.transactionId)
+            if (isinstance(operation, WriteOp) or isinstance(operation, MultiWriteOp)) and isinstance(transaction, ReadOnlyTransaction):
+                raise ReadOnlyWriteError(operation, operation.transactionId)
+            if isinstance(operation, EndOp) and any(previous.status == OperationStatus.IN_PROGRESS for previous in transaction.operations):
+                raise PendingOperationsError(operation, operation.transactionId)
+        elif isinstance(operation, FailOp) or isinstance(operation, RecoverOp):
+            if not self.placement.isValidSite(operation.site):
+                raise SiteOutOfRangeError(operation.site, self.numOfSites)
+
+    def execute(self, operation, checked=False):
+        """
+        runs one tick - executes a single parsed operation and retries the
+        operations that it has woken up.
+        An operation that can not be executed raises its InputError, see check,
+        right after the deadlock detection, the rest of the tick does not run then.
+        checked skips that check for a caller that has just run it itself.
+        """
+        self.time += 1
+        self.stats.startTick(self.time)
+        self.output.emit(events.TICK, self.time)
+        #print(operation)
+        with self.stats.phase("deadlock"):
+            deadlockFound = self.checkAndDealWithDeadlock()
+        if deadlockFound:
+            with self.stats.phase("refresh"):
                 self.refreshOperations()
 
-            self.operations.append(operation)
+        if not checked:
+            self.check(operation)
+        operation.sequence = self.nextSequence
+        self.nextSequence += 1
 
-            if isinstance(operation, BeginOp):
-                if operation.transactionId in self.allTransactions:
-                    print("Error in input line - {}".format(line))
-                    print("Transaction name - {} already exists".format(operation.transactionId))
-                    exit()
-                else:
-                    self.allTransactions[operation.transactionId] = ReadWriteTransaction(operation.transactionId, self.time, self.dataManagers)
-            elif isinstance(operation, BeginROOp):
-                if operation.transactionId in self.allTransactions:
-                    print("Error in input line - {}".format(line))
-                    print("Transaction name - {} already exists".format(operation.transactionId))
-                    exit()
-                else:
-                    self.allTransactions[operation.transactionId] = ReadOnlyTransaction(operation.transactionId, self.time, self.dataManagers)
-            elif isinstance(operation, ReadOp) or isinstance(operation, WriteOp) or isinstance(operation, EndOp):
-                if operation.transactionId not in self.allTransactions or \
-                self.allTransactions[operation.transactionId].status == TransactionStatus.COMPLETED:
-                    print("Error in input line - {}".format(line))
-                    print("Transaction - {} hasnt been begun or is unknown or is ended".format(operation.transactionId))
-                    exit()
-                else:
-                    if isinstance(operation, EndOp):
-                        operation.commitTime = self.time
-                    self.allTransactions[operation.transactionId].operations.append(operation)
-                    self.allTransactions[operation.transactionId].processOperation(operation)
-            elif isinstance(operation, DumpOp):
-                self.dump()
-            elif isinstance(operation, FailOp):
-                if operation.site not in self.dataManagers:
-                    print("Error in input line - {}".format(line))
-                    print("The given site - {} is not in the range 1-20".format(operation.site))
-                    exit()
-                else:
-                    self.fail(operation.site)
-            elif isinstance(operation, RecoverOp):
-                if operation.site not in self.dataManagers:
-                    print("Error in input line - {}".format(line))
-                    print("The given site - {} is not in the range 1-20".format(operation.site))
-                    exit()
-                else:
-                    self.recover(operation.site)
-            
+        if isinstance(operation, BeginOp):
+            self.liveTransactions[operation.transactionId] = self.readWriteTransaction(operation.transactionId, self.time, self.dataManagers, \
+                self.placement, self.readRouter, self.output, self.siteIndex, self.deferredWrites)
+            if self.readWriteTransaction is SnapshotTransaction:
+                self.liveSnapshotTransactions[operation.transactionId] = self.time
+        elif isinstance(operation, BeginROOp):
+            self.liveTransactions[operation.transactionId] = ReadOnlyTransaction(operation.transactionId, self.time, self.dataManagers, \
+                self.placement, self.readRouter, self.output, self.siteIndex)
+            self.liveSnapshotTransactions[operation.transactionId] = self.time
+        elif isinstance(operation, ReadOp) or isinstance(operation, WriteOp) or isinstance(operation, EndOp) or \
+            isinstance(operation, MultiReadOp) or isinstance(operation, MultiWriteOp):
+            if isinstance(operation, EndOp):
+                operation.commitTime = self.time
+            self.liveTransactions[operation.transactionId].operations.append(operation)
+            self.operations[operation.sequence] = operation
+            with self.stats.phase(PHASES[type(operation)]):
+                self.liveTransactions[operation.transactionId].processOperation(operation)
+                self.abortWounded()
+            if operation.status == OperationStatus.IN_PROGRESS:
+                self.stats.operationBlocked(operation, self.time)
+            if isinstance(operation, EndOp) and operation.status == OperationStatus.COMPLETED:
+                self.liveSnapshotTransactions.pop(operation.transactionId, None)
+                self.retireTransaction(operation.transactionId)
+        elif isinstance(operation, DumpOp):
+            operation.result = self.dump()
+        elif isinstance(operation, FailOp):
+            self.fail(operation.site)
+        elif isinstance(operation, RecoverOp):
+            self.recover(operation.site)
+        
+        with self.stats.phase("refresh"):
             self.refreshOperations()
+        with self.stats.phase("log"):
+            fanOut(list(self.dataManagers.values()), "flushLog")
+        if self.checkpointer is not None:
+            with self.stats.phase("checkpoint"):
+                self.checkpointer.tick(self.time)
+        if self.resync is not None:
+            with self.stats.phase("resync"):
+                self.resync.tick()
+        with self.stats.phase("gc"):
+            self.versionGC.collect(self.lowWatermark())
+        self.output.endTick()
+        self.stats.endTick(self.time)
+
+    def lowWatermark(self):
+        """
+        the startTime of the oldest live transaction that reads as of its startTime,
+        or the current time if there is none, or the oldest pinned time if it is older.
+        """
+        watermark = self.time
+        for startTime in self.liveSnapshotTransactions.values():
+            watermark = startTime
+            break
+        if self.pinnedTimes:
+            watermark = min(watermark, min(self.pinnedTimes))
+        return watermark
+
+    def getStats(self):
+        """
+        snapshot of the instrumentation counters and the gc counters.
+        """
+        result = self.stats.snapshot(self.dataManagers)
+        result["gc"] = self.getGCStats()
+        if self.resync is not None:
+            result["resync"] = self.resync.getStats()
+        result["readsPerSite"] = {siteId: self.readRouter.readCounts[siteId] for siteId in self.dataManagers}
+        return result
+
+    def getGCStats(self):
+        """
+        counters of the version garbage collector.
+        """
+        return self.versionGC.getStats()
@@ -1,72 +1,196 @@
 from enum import Enum
+from collections import defaultdict
 from operations import *
 from datamanager import *
+from remotesite import fanOut
+from errors import ReadOnlyWriteError, OperationAfterEndError, PendingOperationsError
+import output as events
 
 class TransactionStatus(Enum):
     ALIVE = 1
     COMPLETED = 2
     ABORTED = 3
 
+class SiteIndex:
+    """
+    Maps every site to the ids of the live transactions that have touched it,
+    so that failing a site only visits the transactions it affects.
+    The transactions keep it up to date through touch and untouchAll.
+    """
+
+    def __init__(self):
+        self.transactions = defaultdict(set)
+
+    def touch(self, transactionId, siteId):
+        self.transactions[siteId].add(transactionId)
+
+    def release(self, transactionId, siteIds):
+        for siteId in siteIds:
+            self.transactions[siteId].discard(transactionId)
+
+    def transactionsAt(self, siteId):
+        return list(self.transactions[siteId])
+
 class TransactionBaseClass:
     """
     Base class to represent both readonly and readwrite transactions.
     """
-    def __init__(self, transactionId, startTime, dataManagers):
+    def __init__(self, transactionId, startTime, dataManagers, placement, readRouter, output, siteIndex):
         """
         operations are a list of all the operations this transaction has received.
         dataManagers is a reference to all the dataManagers.
+        placement is the PlacementDirectory, reads and writes only visit the
+        live sites it lists for their record.
+        readRouter decides in which order the replicas of a record are tried by a read.
+        output is the sink the events of this transaction are emitted to.
+        siteIndex is the SiteIndex that is kept up to date with dataManagersTouched.
         dataManagersTouched are all the data managers that have been accessed for a 
         read/write by this transaction.
+        abortReason says why this transaction was aborted, it stays None if it commits.
         """
         self.transactionId = transactionId
         self.startTime = startTime
         self.operations = []
         self.dataManagers = dataManagers
+        self.placement = placement
+        self.readRouter = readRouter
+        self.output = output
+        self.siteIndex = siteIndex
         self.status = TransactionStatus.ALIVE
         self.dataManagersTouched = set()
         self.isDeadlocked = False
+        self.abortReason = None
 
     def processOperation(self, operation):
         raise Exception("TransactionBaseClass.processOperation not implemented.")
 
+    def touch(self, siteId):
+        """
+        records that this transaction has read or written on siteId.
+        """
+        self.dataManagersTouched.add(siteId)
+        self.siteIndex.touch(self.transactionId, siteId)
 
-class ReadOnlyTransaction(TransactionBaseClass):
-    """
-    class to implement Read Only Transactions.
-    """
-    def __init__(self, transactionId, startTime, dataManagers):
-        super().__init__(transactionId, startTime, dataManagers)
-        print("Read Only Transaction {} begins.".format(self.transactionId))
+    def untouchAll(self):
+        """
+        forgets the sites this transaction has touched, once its locks and data are gone.
+        """
+        self.siteIndex.release(self.transactionId, self.dataManagersTouched)
+        self.dataManagersTouched = set()
+
+    def readSites(self, record):
+        """
+        the live sites that hold record, in the order a read should try them.
+        """
+        return self.readRouter.order(self.placement.liveSitesFor(record), record, self)
+
+    def waitOn(self, operation, records=None):
+        """
+        registers a blocked operation on every site that holds its record,
+        or each of records, so that it gets retried only once one of them changes.
+        """
+        for record in records or (operation.record,):
+            for siteId in self.placement.sitesFor(record):
+                self.dataManagers[siteId].addWaiter(record, operation)
+
+    def tryRead(self, record):
+        """
+        returns (site, value) of a read of record, or None if it can not be read yet.
+        """
+        raise Exception("TransactionBaseClass.tryRead not implemented.")
 
     def readOperation(self, operation):
         """
-        Read operation of a read only transaction.
+        Read operation of a transaction.
         """
         if operation.status == OperationStatus.COMPLETED:
             return
-        
-        for dm in self.dataManagers.values():
-            resultAndData = dm.readRecordForROTrans(operation.record, self.startTime)
-            if resultAndData and resultAndData[0]:
-                print("{} reads x{}.{} => {}".format(self.transactionId, operation.record, dm.dataManagerId, resultAndData[1]))
-                operation.status = OperationStatus.COMPLETED
-                return
-        
+
+        if self.status == TransactionStatus.ABORTED and self.isDeadlocked:
+            self.output.emit(events.SKIPPED_AFTER_DEADLOCK, self.transactionId, operation)
+            operation.status = OperationStatus.COMPLETED
+            return
+
+        result = self.tryRead(operation.record)
+        if result is not None:
+            self.output.emit(events.READ, self.transactionId, operation.record, result[0], result[1])
+            operation.result = result
+            operation.status = OperationStatus.COMPLETED
+            return
+
+        self.waitOn(operation)
         if operation.firstAttempt:
-            print("{} will wait.".format(operation))
+            self.output.emit(events.WAIT, operation)
             operation.firstAttempt = False
 
+    def multiReadOperation(self, operation):
+        """
+        Read operation of a set of records. Every record that is not read yet is tried
+        in one pass, in sorted order, and the reads are only emitted together once all
+        of them have been read. The records that were read keep their locks meanwhile.
+        """
+        if operation.status == OperationStatus.COMPLETED:
+            return
+
+        if self.status == TransactionStatus.ABORTED and self.isDeadlocked:
+            self.output.emit(events.SKIPPED_AFTER_DEADLOCK, self.transactionId, operation)
+            operation.status = OperationStatus.COMPLETED
+            return
+
+        pending = []
+        for record in operation.records:
+            if record not in operation.results:
+                result = self.tryRead(record)
+                if result is None:
+                    pending.append(record)
+                else:
+                    operation.results[record] = result
+
+        if pending:
+            self.waitOn(operation, pending)
+            if operation.firstAttempt:
+                self.output.emit(events.WAIT, operation)
+                operation.firstAttempt = False
+            return
+
+        for record in operation.records:
+            siteId, value = operation.results[record]
+            self.output.emit(events.READ, self.transactionId, record, siteId, value)
+        operation.result = operation.results
+        operation.status = OperationStatus.COMPLETED
+
+
+class ReadOnlyTransaction(TransactionBaseClass):
+    """
+    class to implement Read Only Transactions.
+    """
+    def __init__(self, transactionId, startTime, dataManagers, placement, readRouter, output, siteIndex):
+        super().__init__(transactionId, startTime, dataManagers, placement, readRouter, output, siteIndex)
+        self.output.emit(events.BEGIN_READ_ONLY, self.transactionId)
+
+    def tryRead(self, record):
+        """
+        Read of a read only transaction, it sees the versions committed at or before startTime.
+        """
+        for siteId in self.readSites(record):
+            resultAndData = self.dataManagers[siteId].readRecordForROTrans(record, self.startTime)
+            if resultAndData and resultAndData[0]:
+                self.readRouter.served(siteId)
+                return siteId, resultAndData[1]
+        return None
+
     def processOperation(self, operation):
         """
         Processes all the operation given for a read only transaction.
         """
         if isinstance(operation, ReadOp):
             self.readOperation(operation)
+        elif isinstance(operation, MultiReadOp):
+            self.multiReadOperation(operation)
         elif isinstance(operation, EndOp):
             self.endOperation(operation)
-        elif isinstance(operation, WriteOp):
-            print("InputError: Received a write operation - {} on a ReadOnly Transaction {}".format(operation, self.transactionId))
-            exit()
+        elif isinstance(operation, WriteOp) or isinstance(operation, MultiWriteOp):
+            raise ReadOnlyWriteError(operation, self.transactionId)
 
     def endOperation(self, operation):
         """
@@ -76,13 +200,12 @@ class ReadOnlyTransaction(TransactionBaseClass):
             return
 
         if len(self.operations) > 0 and not isinstance( self.operations[-1], EndOp):
-            print("InputError: {} has received an operation {} after the end operation".format(self.transactionId, self.operations[-1]))
-            exit()
+            raise OperationAfterEndError(self.transactionId, self.operations[-1])
 
         allOperationStatus = [ self.operations[i].status == OperationStatus.COMPLETED for i in range(len(self.operations) - 1) ]
 
         if all(allOperationStatus): # TODO: Decide if you want to throw an error or wait for operations to complete
-            print("{} commits.".format(self.transactionId))
+            self.output.emit(events.COMMIT, self.transactionId)
             operation.status = OperationStatus.COMPLETED
             self.status = TransactionStatus.COMPLETED
         else:
@@ -101,8 +224,7 @@ class ReadOnlyTransaction(TransactionBaseClass):
             # else:
             #     print("InputError: received an {} when there are still operations pending in {}".format(operation, self.transactionId))
             #     exit()
-            print("InputError: received an {} when there are still operations pending in {}".format(operation, self.transactionId))
-            exit()
+            raise PendingOperationsError(operation, self.transactionId)
 
 
 class ReadWriteTransaction(TransactionBaseClass):
@@ -110,74 +232,125 @@ class ReadWriteTransaction(TransactionBaseClass):
     class to implement a Read Write Transaction.
     """
 
-    def __init__(self, transactionId, startTime, dataManagers):
-        super().__init__(transactionId, startTime, dataManagers)
-        print("Read Write Transaction {} begins.".format(self.transactionId))
+    def __init__(self, transactionId, startTime, dataManagers, placement, readRouter, output, siteIndex, deferWrites=False):
+        """
+        with deferWrites the writes still take their locks right away, but the new
+        versions are kept in writeBuffer, which maps a record to (value, the sites
+        it was written to), and only reach the sites when this transaction commits.
+        """
+        super().__init__(transactionId, startTime, dataManagers, placement, readRouter, output, siteIndex)
+        self.deferWrites = deferWrites
+        self.writeBuffer = {}
+        self.output.emit(events.BEGIN, self.transactionId)
 
-    def readOperation(self, operation):
+    def tryRead(self, record):
         """
-        Read operation of a Read Write transaction.
+        Read of a Read Write transaction, it takes a read lock on the site it reads from.
+        A buffered write is read from the buffer, as if from a site it was written to.
+        """
+        if record in self.writeBuffer:
+            value, wroteRecordTo = self.writeBuffer[record]
+            for siteId in self.readSites(record):
+                if siteId in wroteRecordTo:
+                    self.readRouter.served(siteId)
+                    return siteId, value
+
+        for siteId in self.readSites(record):
+            dm = self.dataManagers[siteId]
+            if dm.isReadOKForRWTrans(record, self.transactionId):
+                dm.requestReadLock(self.transactionId, record, self.startTime)
+                if dm.isReadLockAquired(self.transactionId, record):
+                    data = dm.readRecord(record)
+                    self.readRouter.served(siteId)
+                    self.touch(dm.dataManagerId)
+                    return dm.dataManagerId, data
+        return None
+
+    def writeOperation(self, operation):
+        """
+        Write operation of a Read Write transaction
         """
         if operation.status == OperationStatus.COMPLETED:
             return
 
         if self.status == TransactionStatus.ABORTED and self.isDeadlocked:
-            print("{} has already been aborted due to a deadlock, so operation {} wont be executed.".format(self.transactionId, operation))
+            self.output.emit(events.SKIPPED_AFTER_DEADLOCK, self.transactionId, operation)
             operation.status = OperationStatus.COMPLETED
             return
-
-        for dm in self.dataManagers.values():
-            if dm.isReadOKForRWTrans(operation.record, self.transactionId):
-                dm.requestReadLock(self.transactionId, operation.record)
-                if dm.isReadLockAquired(self.transactionId, operation.record):
-                    data = dm.readRecord(operation.record)
-                    print("{} reads x{}.{} => {}".format(self.transactionId, operation.record, dm.dataManagerId, data))
-                    self.dataManagersTouched.add(dm.dataManagerId)
-                    operation.status = OperationStatus.COMPLETED
-                    return
-
+        
+        writable = self.acquireWriteLocks(operation.record)
+        if writable is not None:
+            operation.result = self.writeRecord(writable, operation.record, operation.value)
+            operation.status = OperationStatus.COMPLETED
+            return
+        
+        self.waitOn(operation)
         if operation.firstAttempt:
-            print("{} will wait.".format(operation))
+            self.output.emit(events.WAIT, operation)
             operation.firstAttempt = False
 
-
-
-    def writeOperation(self, operation):
+    def multiWriteOperation(self, operation):
         """
-        Write operation of a Read Write transaction
+        Write operation of a set of records. The write locks of all the records are
+        requested in one pass, in sorted order, and nothing is written until all of
+        them have been granted, then all the records are written together.
         """
         if operation.status == OperationStatus.COMPLETED:
             return
 
         if self.status == TransactionStatus.ABORTED and self.isDeadlocked:
-            print("{} has already been aborted due to a deadlock, so operation {} wont be executed.".format(self.transactionId, operation))
+            self.output.emit(events.SKIPPED_AFTER_DEADLOCK, self.transactionId, operation)
             operation.status = OperationStatus.COMPLETED
             return
-        
-        writeLockStatus = []
-        for dm in self.dataManagers.values():
-            if dm.isWriteOKForRWTrans(operation.record):
-                dm.requestWriteLock(self.transactionId, operation.record)
-                writeLockStatus.append( dm.isWriteLockAquired(self.transactionId, operation.record) )
 
-        wroteRecordTo = []
-        if len(writeLockStatus) > 0 and all(writeLockStatus):
-            for dm in self.dataManagers.values():
-                if dm.isWriteOKForRWTrans(operation.record):
-                    dm.writeRecord(operation.record, operation.value, self.transactionId, None)
-                    wroteRecordTo.append(dm.dataManagerId)
-
-        if len(wroteRecordTo) > 0:
-            print("{} wrote {} to x{} in sites-{}".format(self.transactionId, operation.value, operation.record, wroteRecordTo))
-            for dmId in wroteRecordTo:
-                self.dataManagersTouched.add(dmId)
-            operation.status = OperationStatus.COMPLETED
+        granted = [self.acquireWriteLocks(record) for record in operation.records]
+        pending = [record for record, writable in zip(operation.records, granted) if writable is None]
+        if pending:
+            self.waitOn(operation, pending)
+            if operation.firstAttempt:
+                self.output.emit(events.WAIT, operation)
+                operation.firstAttempt = False
             return
-        
-        if operation.firstAttempt:
-            print("{} will wait.".format(operation))
-            operation.firstAttempt = False
 
+        operation.result = {record: self.writeRecord(writable, record, operation.values[record]) \
+            for record, writable in zip(operation.records, granted)}
+        operation.status = OperationStatus.COMPLETED
+
+    def acquireWriteLocks(self, record):
+        """
+        requests the write lock of record on all its live sites, returns those
+        sites if every lock was granted and None otherwise.
+        """
+        candidates = [self.dataManagers[siteId] for siteId in self.placement.liveSitesFor(record)]
+        lockStatus = fanOut(candidates, "tryWriteLock", self.transactionId, record, self.startTime)
+        writable = [dm for dm, status in zip(candidates, lockStatus) if status is not None]
+        writeLockStatus = [status for status in lockStatus if status is not None]
+
+        if len(writeLockStatus) > 0 and all(writeLockStatus):
+            return writable
+        return None
+
+    def writeRecord(self, writable, record, value):
+        """
+        writes value to record on the sites writable, whose write locks are held,
+        or into the writeBuffer with deferWrites.
+        Returns the ids of those sites.
+        """
+        wroteRecordTo = [dm.dataManagerId for dm in writable]
+        if self.deferWrites:
+            self.writeBuffer[record] = (value, wroteRecordTo)
+        else:
+            fanOut(writable, "writeRecord", record, value, self.transactionId, None)
+        self.writeCompleted(record, value, wroteRecordTo)
+        return wroteRecordTo
+
+    def writeCompleted(self, record, value, wroteRecordTo):
+        """
+        a write has been written to the sites wroteRecordTo.
+        """
+        self.output.emit(events.WRITE, self.transactionId, value, record, wroteRecordTo)
+        for dmId in wroteRecordTo:
+            self.touch(dmId)
 
     def processOperation(self, operation):
         """
@@ -187,6 +360,10 @@ class ReadWriteTransaction(TransactionBaseClass):
             self.readOperation(operation)
         elif isinstance(operation, WriteOp):
             self.writeOperation(operation)
+        elif isinstance(operation, MultiReadOp):
+            self.multiReadOperation(operation)
+        elif isinstance(operation, MultiWriteOp):
+            self.multiWriteOperation(operation)
         elif isinstance(operation, EndOp):
             self.endOperation(operation)
 
@@ -199,36 +376,35 @@ class ReadWriteTransaction(TransactionBaseClass):
             return
 
         if self.status == TransactionStatus.ABORTED and self.isDeadlocked:
-            print("{} was aborted due to a deadlock in the past.".format(self.transactionId))
-            self.dataManagersTouched = set()
+            self.output.emit(events.END_AFTER_DEADLOCK, self.transactionId)
+            self.untouchAll()
             operation.status = OperationStatus.COMPLETED
             self.status = TransactionStatus.COMPLETED
             return
 
         if len(self.operations) > 0 and not isinstance( self.operations[-1], EndOp):
-            print("InputError: {} has received an operation {} after the end operation".format(self.transactionId, self.operations[-1]))
-            exit()
+            raise OperationAfterEndError(self.transactionId, self.operations[-1])
 
         allOperationStatus = [ self.operations[i].status == OperationStatus.COMPLETED for i in range(len(self.operations) - 1) ]
         
         if all(allOperationStatus): # TODO: Decide if you want to throw an error or wait for operations to complete
+            dataManagers = list(self.dataManagers.values())
             if self.status == TransactionStatus.ABORTED:
-                for dataManager in self.dataManagers.values():
-                    dataManager.removeUncommittedDataForTrans(self.transactionId)
-                    dataManager.removeLocksForTrans(self.transactionId)
-                print("{} aborts due to a site failure.".format(self.transactionId))
+                self.discardWrites()
+                self.abortReason = "siteFailure"
+                self.output.emit(events.ABORT_SITE_FAILURE, self.transactionId)
             else:
-                for dataManager in self.dataManagers.values():
-                    dataManager.commitTransaction(self.transactionId, operation.commitTime)
-                    dataManager.removeLocksForTrans(self.transactionId)
-                print("{} commits.".format(self.transactionId))
+                writes = {record: value for record, (value, _) in self.writeBuffer.items()}
+                fanOut(dataManagers, "commitTransaction", self.transactionId, operation.commitTime, writes)
+                fanOut(dataManagers, "removeLocksForTrans", self.transactionId)
+                self.writeBuffer = {}
+                self.output.emit(events.COMMIT, self.transactionId)
             
-            self.dataManagersTouched = set()
+            self.untouchAll()
             operation.status = OperationStatus.COMPLETED
             self.status = TransactionStatus.COMPLETED
         else:
-            print("InputError: received an {} when there are still operations pending in {}".format(operation, self.transactionId))
-            exit()
+            raise PendingOperationsError(operation, self.transactionId)
         
             
 
@@ -237,13 +413,114 @@ class ReadWriteTransaction(TransactionBaseClass):
         process to abort this transaction if it gets deadlocked.
         """
         self.isDeadlocked = True
+        self.abort("deadlock")
+        self.output.emit(events.ABORT_DEADLOCK, self.transactionId)
+
+    def abortToPreventDeadlock(self):
+        """
+        aborts this transaction because the deadlock prevention decided so,
+        the rest of it is handled like a deadlocked transaction.
+        """
+        self.isDeadlocked = True
+        self.abort("deadlockPrevention")
+        self.output.emit(events.ABORT_PREVENTION, self.transactionId)
+
+    def abort(self, reason):
+        """
+        aborts this transaction right away for reason, its operations are marked as
+        completed and its uncommitted data and locks are removed from every site.
+        """
         self.status = TransactionStatus.ABORTED
-        self.dataManagersTouched = set()
+        self.abortReason = reason
+        self.untouchAll()
 
         for operation in self.operations:
             operation.status = OperationStatus.COMPLETED
 
-        for dataManager in self.dataManagers.values():
-            dataManager.removeUncommittedDataForTrans(self.transactionId)
-            dataManager.removeLocksForTrans(self.transactionId)
-        print("{} was aborted due to a deadlock".format(self.transactionId))
\ No newline at end of file
+        self.discardWrites()
+
+    def discardWrites(self):
+        """
+        throws away the writes of this transaction and releases its locks,
+        buffered writes never reached a site so they are just dropped.
+        """
+        dataManagers = list(self.dataManagers.values())
+        if self.deferWrites:
+            self.writeBuffer = {}
+        else:
+            fanOut(dataManagers, "removeUncommittedDataForTrans", self.transactionId)
+        fanOut(dataManagers, "removeLocksForTrans", self.transactionId)
+
+
+class SnapshotTransaction(ReadWriteTransaction):
+    """
+    class to implement a Read Write Transaction under snapshot isolation.
+    Reads take no locks, they see its own writes and otherwise the versions committed
+    at or before startTime, like a read only transaction. Writes take locks as usual.
+    At its end it aborts if another transaction has committed one of the records it
+    wrote after startTime, so the first committer wins.
+    """
+
+    def __init__(self, transactionId, startTime, dataManagers, placement, readRouter, output, siteIndex, deferWrites=False):
+        """
+        writes maps the records this transaction has written to (value, a site it was written to).
+        writeConflict is set if it got aborted by the first committer wins rule.
+        """
+        super().__init__(transactionId, startTime, dataManagers, placement, readRouter, output, siteIndex, deferWrites)
+        self.writes = {}
+        self.writeConflict = False
+
+    def tryRead(self, record):
+        """
+        Read of a snapshot isolation transaction, it sees its own writes first.
+        """
+        if record in self.writes:
+            value, siteId = self.writes[record]
+            return siteId, value
+
+        for siteId in self.readSites(record):
+            resultAndData = self.dataManagers[siteId].readRecordForROTrans(record, self.startTime)
+            if resultAndData and resultAndData[0]:
+                self.readRouter.served(siteId)
+                return siteId, resultAndData[1]
+        return None
+
+    def writeCompleted(self, record, value, wroteRecordTo):
+        super().writeCompleted(record, value, wroteRecordTo)
+        self.writes[record] = (value, wroteRecordTo[0])
+
+    def hasWriteConflict(self):
+        """
+        checks if a version of a record this transaction wrote has been committed
+        by another transaction after startTime.
+        """
+        for record in self.writes:
+            for siteId in self.placement.sitesFor(record):
+                commitTime = self.dataManagers[siteId].latestCommitTime(record)
+                if commitTime is not None and commitTime > self.startTime:
+                    return True
+        return False
+
+    def endOperation(self, operation):
+        """
+        End operation of a snapshot isolation transaction, it aborts on a write
+        conflict and ends like a read write transaction otherwise.
+        """
+        if operation.status != OperationStatus.COMPLETED and self.status == TransactionStatus.ALIVE and \
+            all(previous.status == OperationStatus.COMPLETED for previous in self.operations[:-1]) and \
+            self.hasWriteConflict():
+            self.writeConflict = True
+            self.abortReason = "writeConflict"
+            self.discardWrites()
+            self.output.emit(events.ABORT_WRITE_CONFLICT, self.transactionId)
+            self.untouchAll()
+            operation.status = OperationStatus.COMPLETED
+            self.status = TransactionStatus.COMPLETED
+            return
+        super().endOperation(operation)
+
+# Maps an isolation level to the class of the read write transactions.
+ISOLATION_LEVELS = {
+    "2pl": ReadWriteTransaction,
+    "snapshot": SnapshotTransaction,
+}
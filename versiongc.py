@@ -0,0 +1,69 @@
+import sys
+
+class VersionGarbageCollector:
+    """
+    Incrementally drops the committed versions that no live or future
+    read only transaction can read.
+    A read only transaction reads the newest version committed at or before its
+    startTime, so with the low watermark being the startTime of the oldest live
+    read only transaction (or the current time if there is none), every committed
+    version older than the newest one committed at or before the watermark is garbage.
+    """
+
+    def __init__(self, dataManagers, recordsPerTick=16):
+        """
+        dataManagers is a reference to all the dataManagers.
+        recordsPerTick bounds how many records are collected in one tick.
+        The counters keep track of the work done and the memory reclaimed.
+        """
+        self.dataManagers = dataManagers
+        self.recordsPerTick = recordsPerTick
+        self.nextSite = 0
+        self.runs = 0
+        self.recordsCollected = 0
+        self.versionsReclaimed = 0
+        self.bytesReclaimed = 0
+
+    def collect(self, watermark):
+        """
+        collects up to recordsPerTick records that have been written since they
+        were last collected, starting from a different site every tick.
+        Records that still hold more than one version are put back at the end of
+        their site's candidates, as they might become collectable later.
+        """
+        self.runs += 1
+        budget = self.recordsPerTick
+        siteIds = list(self.dataManagers.keys())
+        for offset in range(len(siteIds)):
+            if budget <= 0:
+                break
+            siteId = siteIds[(self.nextSite + offset) % len(siteIds)]
+            budget -= self.collectSite(self.dataManagers[siteId], watermark, budget)
+        self.nextSite = (self.nextSite + 1) % max(len(siteIds), 1)
+
+    def collectSite(self, dm, watermark, budget):
+        """
+        collects up to budget records of a single site, returns the number of records collected.
+        """
+        collected = min(budget, len(dm.gcCandidates))
+        for _ in range(collected):
+            recordId = dm.gcCandidates.popitem(last=False)[0]
+            record = dm.records[recordId]
+            for version in record.collectVersions(watermark):
+                self.versionsReclaimed += 1
+                self.bytesReclaimed += sys.getsizeof(version) + sys.getsizeof(version.data)
+            if len(record.versions) > 1:
+                dm.gcCandidates[recordId] = None
+        self.recordsCollected += collected
+        return collected
+
+    def getStats(self):
+        """
+        returns the gc counters.
+        """
+        return {
+            "runs": self.runs,
+            "recordsCollected": self.recordsCollected,
+            "versionsReclaimed": self.versionsReclaimed,
+            "bytesReclaimed": self.bytesReclaimed,
+        }
@@ -0,0 +1,157 @@
+from collections import Counter, defaultdict
+
+def waitDie(requester, startTime, conflicting):
+    """
+    an older requester waits for the younger transactions it conflicts with,
+    a younger requester dies, so a transaction only ever waits on younger ones.
+    """
+    if all(startTime < otherStartTime for otherStartTime in conflicting.values()):
+        return []
+    return [requester]
+
+def woundWait(requester, startTime, conflicting):
+    """
+    an older requester wounds the younger transactions it conflicts with and
+    waits for them to be aborted, a younger requester waits, so a transaction
+    only ever waits on older ones.
+    """
+    return [transactionId for transactionId, otherStartTime in conflicting.items() if otherStartTime > startTime]
+
+# Maps a deadlock prevention scheme to a function that gets a conflicting lock
+# request and returns the transactions to abort, if the requester is one of
+# them its request is dropped.
+PREVENTION_POLICIES = {
+    "wait-die": waitDie,
+    "wound-wait": woundWait,
+}
+
+class WaitForGraph:
+    """
+    A persistent wait-for graph shared by all the records of all the sites.
+    An edge (waiter, holder) means that the waiter transaction is queued behind
+    a lock of the holder transaction on some record.
+    The same edge can be contributed by many records, so every edge keeps a count
+    and it only disappears from the graph once every record has released it.
+    """
+
+    def __init__(self, prevention=None):
+        """
+        edges maps a waiter transaction id to a Counter of holder transaction ids.
+        prevention is one of PREVENTION_POLICIES or None to only detect deadlocks,
+        wounded collects the transactions it has decided to abort.
+        """
+        self.edges = defaultdict(Counter)
+        self.prevention = prevention
+        self.wounded = []
+
+    def resolveConflict(self, requester, startTime, conflicting):
+        """
+        decides a lock request of requester that would wait on the transactions
+        of conflicting, a dict of their start times, with the prevention scheme.
+        Returns False if the request must be dropped because the requester dies.
+        """
+        victims = self.prevention(requester, startTime, conflicting)
+        self.wounded.extend(victims)
+        return requester not in victims
+
+    def drainWounded(self):
+        """
+        the transactions to abort since the last drain.
+        """
+        wounded = self.wounded
+        self.wounded = []
+        return wounded
+
+    def addEdge(self, waiter, holder):
+        """
+        adds one occurrence of the edge waiter -> holder.
+        """
+        self.edges[waiter][holder] += 1
+
+    def removeEdge(self, waiter, holder):
+        """
+        removes one occurrence of the edge waiter -> holder.
+        """
+        neighbours = self.edges.get(waiter)
+        if neighbours is None or holder not in neighbours:
+            return
+        neighbours[holder] -= 1
+        if neighbours[holder] <= 0:
+            del neighbours[holder]
+        if not neighbours:
+            del self.edges[waiter]
+
+    def addEdges(self, edges):
+        """
+        adds every edge of a Counter of (waiter, holder) pairs.
+        """
+        for (waiter, holder), count in edges.items():
+            self.edges[waiter][holder] += count
+
+    def removeEdges(self, edges):
+        """
+        removes every edge of a Counter of (waiter, holder) pairs.
+        """
+        for (waiter, holder), count in edges.items():
+            for _ in range(count):
+                self.removeEdge(waiter, holder)
+
+    def getBlockingRelations(self):
+        """
+        all the (waiter, holder) pairs currently in the graph.
+        """
+        return {(waiter, holder) for waiter, neighbours in self.edges.items() for holder in neighbours}
+
+    def findDeadlocks(self):
+        """
+        Runs a single iterative pass of Tarjan's algorithm over the graph
+        and returns every strongly connected component that contains a cycle.
+        Each component is returned as a list of transaction ids.
+        """
+        index = {}
+        lowLink = {}
+        onStack = set()
+        stack = []
+        deadlocks = []
+        counter = 0
+
+        for root in list(self.edges.keys()):
+            if root in index:
+                continue
+            index[root] = lowLink[root] = counter
+            counter += 1
+            stack.append(root)
+            onStack.add(root)
+            work = [(root, iter(self.edges.get(root, ())))]
+            while work:
+                node, neighbours = work[-1]
+                pushed = False
+                for neighbour in neighbours:
+                    if neighbour not in index:
+                        index[neighbour] = lowLink[neighbour] = counter
+                        counter += 1
+                        stack.append(neighbour)
+                        onStack.add(neighbour)
+                        work.append((neighbour, iter(self.edges.get(neighbour, ()))))
+                        pushed = True
+                        break
+                    elif neighbour in onStack:
+                        lowLink[node] = min(lowLink[node], index[neighbour])
+                if pushed:
+                    continue
+
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowLink[parent] = min(lowLink[parent], lowLink[node])
+                if lowLink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        onStack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    if len(component) > 1 or node in self.edges.get(node, ()):
+                        deadlocks.append(component)
+        return deadlocks
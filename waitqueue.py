@@ -0,0 +1,48 @@
+import heapq
+
+class WaitQueue:
+    """
+    Collects the blocked operations that have been woken up by a change
+    on a record they are waiting for, so that only those operations are
+    retried instead of every operation ever received.
+    Operations are retried in the order they were received, which is given
+    by their sequence number.
+    """
+
+    def __init__(self):
+        """
+        ready is a heap of (sequence, operation) of the woken up operations.
+        queued is the set of sequence numbers that are currently in ready.
+        """
+        self.ready = []
+        self.queued = set()
+
+    def wake(self, operation):
+        """
+        marks a blocked operation as ready to be retried.
+        """
+        if operation.sequence in self.queued:
+            return
+        self.queued.add(operation.sequence)
+        heapq.heappush(self.ready, (operation.sequence, operation))
+
+    def drain(self):
+        """
+        yields the woken up operations in the order they were received.
+        An operation woken up by a later operation during the drain is yielded
+        in the same drain if it was received after the operation currently being
+        retried, otherwise it is kept for the next drain.
+        """
+        deferred = []
+        current = -1
+        while self.ready:
+            sequence, operation = heapq.heappop(self.ready)
+            if sequence <= current:
+                deferred.append((sequence, operation))
+                continue
+            self.queued.discard(sequence)
+            current = sequence
+            yield operation
+
+        for item in deferred:
+            heapq.heappush(self.ready, item)
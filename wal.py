@@ -0,0 +1,81 @@
+import os
+from ast import literal_eval
+
+class WriteAheadLog:
+    """
+    Append only log of the committed versions of a single site.
+    Every line is one committed version - record, transactionId, commitTime and data
+    separated by tabs, or a site event - fail or recover and its time.
+    The transactionId and data are written as their repr, so tabs and newlines in
+    them are escaped and replay gives them back with their types, like 5 or "5".
+    Appended versions are buffered and only written out and synced by flush, so all
+    the commits of a tick can share a single fsync (group commit). With groupCommit
+    turned off every append is synced on its own.
+    """
+
+    def __init__(self, path, groupCommit=True):
+        """
+        pending holds the lines that have been appended since the last flush.
+        syncs counts the number of fsyncs done so far.
+        """
+        self.path = path
+        self.groupCommit = groupCommit
+        self.pending = []
+        self.syncs = 0
+        self.file = open(path, "a")
+
+    def replay(self):
+        """
+        yields (record, data, transactionId, commitTime) for every version in the log,
+        oldest first. A site event is yielded as (event, None, None, time).
+        A torn last line, left by a crash in the middle of a write, is ignored.
+        """
+        with open(self.path) as logFile:
+            for line in logFile:
+                if not line.endswith("\n"):
+                    break
+                fields = line[:-1].split("\t", 3)
+                if len(fields) == 2:
+                    yield fields[0], None, None, int(fields[1])
+                else:
+                    record, transactionId, commitTime, data = fields
+                    yield int(record), literal_eval(data), literal_eval(transactionId), int(commitTime)
+
+    def append(self, record, version):
+        """
+        logs a committed version of record.
+        """
+        self.pending.append("{}\t{!r}\t{}\t{!r}\n".format(record, version.transactionId, version.commitTime, version.data))
+        if not self.groupCommit:
+            self.flush()
+
+    def appendEvent(self, event, time):
+        """
+        logs that the site failed or recovered at time, it is synced right away.
+        """
+        self.pending.append("{}\t{}\n".format(event, time))
+        self.flush()
+
+    def flush(self):
+        """
+        writes out the pending versions and syncs them to disk with one fsync.
+        """
+        if not self.pending:
+            return
+        self.file.write("".join(self.pending))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = []
+        self.syncs += 1
+
+    def truncate(self):
+        """
+        drops everything in the log, gets called once its versions are in a checkpoint.
+        """
+        self.flush()
+        self.file.truncate(0)
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.flush()
+        self.file.close()
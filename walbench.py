@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+import time
+from transactionManager import TransactionManager
+from output import TextSink, QUIET
+
+# python3 walbench.py 2000
+# prints the commit throughput with the write-ahead log synced once per tick (group commit)
+# and once per committed version.
+
+def buildWorkload(numOfTransactions, writesPerTransaction=5):
+    """
+    every transaction writes writesPerTransaction records and commits.
+    """
+    lines = []
+    for i in range(1, numOfTransactions + 1):
+        lines.append("begin(T{})".format(i))
+        for j in range(writesPerTransaction):
+            lines.append("W(T{},x{},{})".format(i, 1 + (i + j) % 20, i))
+        lines.append("end(T{})".format(i))
+    return "\n".join(lines) + "\n"
+
+def commitsPerSecond(workload, numOfTransactions, groupCommit):
+    with tempfile.TemporaryDirectory() as logDirectory:
+        inputPath = os.path.join(logDirectory, "input")
+        with open(inputPath, "w") as inputFile:
+            inputFile.write(workload)
+        transManager = TransactionManager(10, 20, inputPath, logDirectory=logDirectory, groupCommit=groupCommit, \
+            output=TextSink(level=QUIET))
+        start = time.perf_counter()
+        transManager.run()
+        elapsed = time.perf_counter() - start
+        syncs = sum(dm.log.syncs for dm in transManager.dataManagers.values())
+    return numOfTransactions / elapsed, syncs
+
+if __name__ == "__main__":
+    numOfTransactions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workload = buildWorkload(numOfTransactions)
+    for groupCommit in (True, False):
+        throughput, syncs = commitsPerSecond(workload, numOfTransactions, groupCommit)
+        print("group commit {:5}: {:8.1f} commits/s, {} fsyncs".format(str(groupCommit), throughput, syncs))